@@ -1,20 +1,66 @@
-from flask import Flask, jsonify
+from flask import Flask, Request, jsonify, request, g, Response
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from database import db
 import os
+import json
+import time
 from dotenv import load_dotenv
 
+# Load environment variables (sebelum import routes, karena setting
+# face recognition dibaca saat model dibuat)
+load_dotenv()
+
 # Import routes
 from routes.auth import auth_bp
 from routes.mahasiswa import mahasiswa_bp
-from routes.absensi import absensi_bp
+from routes.absensi import absensi_bp, stream_sessions
+from model.recognition_executor import recognition_executor
+from model.recognition_jobs import recognition_jobs
+from model.lazy_model import face_model
+from metrics import metrics, REQUEST_LATENCY
 
-# Load environment variables
-load_dotenv()
+def model_value(getter):
+    """Callback metric dari face_model, kosong kalau model belum pernah dibuat
+    (membaca /metrics tidak boleh memicu import OpenCV)"""
+    return lambda: getter() if face_model.initialized else None
+
+# Metric yang dibaca langsung dari state aplikasi saat /metrics diminta
+metrics.gauge('absensi_model_ready', 'Model wajah sudah dimuat dan siap (1/0)',
+              lambda: int(face_model.ready))
+metrics.gauge('absensi_model_generation', 'Generation model wajah yang sedang dipakai',
+              model_value(lambda: face_model.generation))
+metrics.gauge('absensi_model_faces', 'Jumlah histogram wajah di identity index',
+              model_value(lambda: len(face_model.index)))
+metrics.gauge('absensi_model_training_pending', 'Training model yang menunggu/berjalan di background',
+              model_value(lambda: face_model.training_pending))
+metrics.gauge('absensi_result_cache_hits_total', 'Hit result cache frame hampir identik',
+              model_value(lambda: face_model.result_cache.hits), metric_type='counter')
+metrics.gauge('absensi_result_cache_misses_total', 'Miss result cache frame hampir identik',
+              model_value(lambda: face_model.result_cache.misses), metric_type='counter')
+metrics.gauge('absensi_recognition_queue_depth', 'Job absensi async yang menunggu di antrian',
+              lambda: recognition_jobs.stats()['queue_depth'])
+metrics.gauge('absensi_stream_sessions', 'Sesi streaming kiosk yang aktif',
+              lambda: len(stream_sessions))
+
+class AbsensiRequest(Request):
+    """Request dengan batas ukuran body yang bisa dinaikkan per endpoint
+    (request.max_content_length = ...), misalnya untuk upload ZIP bulk"""
+    _max_content_length = None
+    
+    @property
+    def max_content_length(self):
+        if self._max_content_length is not None:
+            return self._max_content_length
+        return super().max_content_length
+    
+    @max_content_length.setter
+    def max_content_length(self, value):
+        self._max_content_length = value
 
 def create_app():
     app = Flask(__name__)
+    app.request_class = AbsensiRequest
     
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
@@ -27,16 +73,60 @@ def create_app():
     )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Batas ukuran body request (foto absensi dan upload mahasiswa)
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_SIZE', str(16 * 1024 * 1024)))
+    # Batas khusus upload ZIP bulk enrollment (POST /api/mahasiswa/bulk)
+    app.config['BULK_MAX_UPLOAD_SIZE'] = int(os.getenv('BULK_MAX_UPLOAD_SIZE', str(512 * 1024 * 1024)))
+    
+    # Face recognition: jumlah worker process (0 = inline di thread request)
+    app.config['RECOGNITION_WORKERS'] = int(os.getenv('RECOGNITION_WORKERS', '0'))
+    app.config['RECOGNITION_TIMEOUT'] = float(os.getenv('RECOGNITION_TIMEOUT', '10'))
+    
+    # Roster per kiosk, JSON: {"lab-1": {"jurusan": "TI"}, "r201": {"roster": [1, 2, 3]}}
+    try:
+        app.config['KIOSK_ROSTERS'] = json.loads(os.getenv('KIOSK_ROSTERS', '{}'))
+    except ValueError as e:
+        print(f"Error parsing KIOSK_ROSTERS: {e}")
+        app.config['KIOSK_ROSTERS'] = {}
+    
+    # Antrian absensi async (0 worker = mode async nonaktif)
+    app.config['RECOGNITION_QUEUE_WORKERS'] = int(os.getenv('RECOGNITION_QUEUE_WORKERS', '0'))
+    app.config['RECOGNITION_QUEUE_SIZE'] = int(os.getenv('RECOGNITION_QUEUE_SIZE', '100'))
+    app.config['RECOGNITION_JOB_TTL'] = float(os.getenv('RECOGNITION_JOB_TTL', '300'))
+    # Load model wajah di background saat server start (0 = load saat request pertama).
+    # Hanya dipakai entry point server (start_face_warmup), bukan create_app,
+    # supaya script maintenance tidak ikut import OpenCV
+    app.config['FACE_WARMUP'] = os.getenv('FACE_WARMUP', '1') == '1'
+    
     # Initialize extensions
     CORS(app, origins=['http://localhost:3000', 'http://127.0.0.1:3000'], supports_credentials=True, methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
     JWTManager(app)
     db.init_app(app)
+    recognition_executor.init_app(app)
+    recognition_jobs.init_app(app)
     
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api')
     app.register_blueprint(mahasiswa_bp, url_prefix='/api')
     app.register_blueprint(absensi_bp, url_prefix='/api')
     
+    # Latency per endpoint untuk /metrics
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+    
+    @app.after_request
+    def record_request_latency(response):
+        start = g.pop('request_start', None)
+        if start is not None:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start,
+                endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+                method=request.method,
+                status=str(response.status_code)
+            )
+        return response
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -45,6 +135,13 @@ def create_app():
             'message': 'Endpoint tidak ditemukan'
         }), 404
     
+    @app.errorhandler(413)
+    def payload_too_large(error):
+        return jsonify({
+            'success': False,
+            'message': 'Ukuran request terlalu besar'
+        }), 413
+    
     @app.errorhandler(500)
     def internal_error(error):
         return jsonify({
@@ -60,13 +157,32 @@ def create_app():
         }), 405
     
     # Health check endpoint
+    # ?ready=1 untuk readiness probe: 503 sampai model wajah selesai dimuat
     @app.route('/health', methods=['GET'])
     def health_check():
+        model = face_model.readiness()
+        if face_model.initialized:
+            model.update(
+                generation=face_model.generation,
+                faces=len(face_model.index),
+                training_pending=face_model.training_pending
+            )
+        status = 200 if face_model.ready or not request.args.get('ready') else 503
         return jsonify({
             'success': True,
             'message': 'Server is running',
-            'status': 'healthy'
-        }), 200
+            'status': 'healthy',
+            'ready': face_model.ready,
+            'model': model,
+            'result_cache': face_model.result_cache.stats() if face_model.initialized else None,
+            'recognition_queue': recognition_jobs.stats(),
+            'recognition_batch': face_model.batcher.stats() if face_model.initialized and face_model.batcher else None
+        }), status
+    
+    # Metrics dalam format teks Prometheus
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
     
     # Root endpoint
     @app.route('/', methods=['GET'])
@@ -84,6 +200,11 @@ def create_app():
     
     return app
 
+def start_face_warmup(app):
+    """Warm-up model wajah, dipanggil entry point server setelah database siap"""
+    if app.config['FACE_WARMUP']:
+        face_model.warm_up(app)
+
 def init_database():
     """Initialize database tables"""
     with app.app_context():
@@ -100,6 +221,8 @@ if __name__ == '__main__':
         print(f"Database initialization error: {e}")
         print("Please make sure MySQL is running and database 'absensi_mahasiswa' exists")
     
+    start_face_warmup(app)
+    
     # Run the app
     app.run(
         host='0.0.0.0',
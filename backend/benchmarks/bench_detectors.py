@@ -0,0 +1,71 @@
+"""Bandingkan latency dan hit rate backend detector wajah (haar, lbp, dnn).
+
+Foto yang dipakai sebaiknya masing-masing berisi satu wajah, misalnya foto
+pendaftaran di static/uploads atau foto dari kamera kiosk.
+
+Contoh:
+    python benchmarks/bench_detectors.py --images static/uploads --repeat 3
+    FACE_DNN_MODEL=res10.caffemodel FACE_DNN_CONFIG=deploy.prototxt \\
+        python benchmarks/bench_detectors.py --backends haar dnn
+"""
+import argparse
+import json
+import os
+import sys
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.enrollment import is_derived_file  # noqa: E402
+from model.face_detector import DETECTOR_BACKENDS, compare_detectors  # noqa: E402
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+
+def load_images(directory, limit):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        # Crop wajah dan thumbnail bukan foto asli
+        if not name.lower().endswith(IMAGE_EXTENSIONS) or is_derived_file(name):
+            continue
+        gray = cv2.imread(os.path.join(directory, name), cv2.IMREAD_GRAYSCALE)
+        if gray is not None:
+            images.append(gray)
+        if limit and len(images) >= limit:
+            break
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', default='static/uploads', help='Folder berisi foto wajah')
+    parser.add_argument('--backends', nargs='+', default=list(DETECTOR_BACKENDS))
+    parser.add_argument('--limit', type=int, default=0, help='Jumlah foto maksimum (0 = semua)')
+    parser.add_argument('--min-size', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', help='Tulis hasil dalam format JSON ke file ini')
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        parser.error(f'Tidak ada foto di {args.images}')
+
+    results = compare_detectors(images, args.backends, args.min_size, args.repeat)
+
+    print(f"Images: {len(images)}")
+    print(f"{'backend':<8}{'hit rate':>10}{'multi':>8}{'median (ms)':>14}{'p95 (ms)':>12}")
+    for backend, r in results.items():
+        if 'error' in r:
+            print(f"{backend:<8}  tidak tersedia: {r['error']}")
+            continue
+        print(f"{backend:<8}{r['hit_rate']:>10.1%}{r['multiple_faces']:>8}"
+              f"{r['latency_median_ms']:>14.2f}{r['latency_p95_ms']:>12.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'images': len(images), 'backends': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
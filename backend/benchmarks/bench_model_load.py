@@ -0,0 +1,107 @@
+"""Benchmark startup/reload model: YAML+pickle (LBPH) vs .npy memory-mapped.
+
+Contoh:
+    python benchmarks/bench_model_load.py --students 2000 --repeat 5
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.face_recognition_model import FaceRecognitionModel  # noqa: E402
+
+
+def synthetic_faces(count, seed=0):
+    """ROI wajah 100x100 acak (cukup untuk mengukur ukuran dan waktu load)"""
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, (100, 100), dtype=np.uint8) for _ in range(count)]
+
+
+def build_model(directory, model_format, faces):
+    os.environ['FACE_MODEL_DIR'] = directory
+    os.environ['FACE_MODEL_FORMAT'] = model_format
+    model = FaceRecognitionModel()
+    ids = list(range(1, len(faces) + 1))
+    names = [f'Mahasiswa {i}' for i in ids]
+
+    start = time.perf_counter()
+    snapshot = model.train_faces(faces, ids, names)
+    train_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.save_model(snapshot)
+    save_time = time.perf_counter() - start
+    return train_time, save_time
+
+
+def time_load(directory, model_format, repeat):
+    os.environ['FACE_MODEL_DIR'] = directory
+    os.environ['FACE_MODEL_FORMAT'] = model_format
+    timings = []
+    for _ in range(repeat):
+        model = FaceRecognitionModel()
+        start = time.perf_counter()
+        if not model.load_model():
+            raise RuntimeError(f'Gagal load model {model_format}')
+        # Satu search supaya halaman mmap benar-benar disentuh
+        model.index.search(model.face_histogram(np.zeros((100, 100), np.uint8)))
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def artifact_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory)
+        if name.startswith('face_')
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='Tulis hasil dalam format JSON ke file ini')
+    args = parser.parse_args()
+
+    faces = synthetic_faces(args.students)
+    results = {'students': args.students, 'formats': {}}
+    workdir = tempfile.mkdtemp(prefix='face_model_bench_')
+    try:
+        for model_format in ('yml', 'npy'):
+            directory = os.path.join(workdir, model_format)
+            train_time, save_time = build_model(directory, model_format, faces)
+            timings = time_load(directory, model_format, args.repeat)
+            results['formats'][model_format] = {
+                'train_s': train_time,
+                'save_s': save_time,
+                'load_s': timings,
+                'load_median_s': float(np.median(timings)),
+                'size_bytes': artifact_size(directory)
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Students: {args.students}")
+    print(f"{'format':<8}{'train (s)':>12}{'save (s)':>12}{'load (s)':>12}{'size (MB)':>12}")
+    for model_format, r in results['formats'].items():
+        print(f"{model_format:<8}{r['train_s']:>12.3f}{r['save_s']:>12.3f}"
+              f"{r['load_median_s']:>12.3f}{r['size_bytes'] / 1e6:>12.1f}")
+    yml = results['formats']['yml']['load_median_s']
+    npy = results['formats']['npy']['load_median_s']
+    print(f"Load speedup npy vs yml: {yml / npy:.1f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
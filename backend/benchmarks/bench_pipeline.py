@@ -0,0 +1,281 @@
+"""Benchmark per tahap pipeline face recognition dengan wajah sintetis.
+
+Tahap yang diukur per frame: base64 decode, imdecode (warna), grayscale,
+imdecode grayscale langsung (jalur produksi), quality gate, deteksi, crop +
+resize, histogram LBP, predict (search index) dan lookup nama. Semua data
+dibuat offline dan deterministik (seed), jadi hasil antar versi bisa
+dibandingkan.
+
+Index roster besar ditulis ke file .npy lalu di-memory-map, sama seperti
+format model npy, jadi roster 50k (~3.3 GB) tidak harus muat di RAM.
+
+Contoh:
+    python benchmarks/bench_pipeline.py --rosters 100 1000 10000 50000 --output hasil.json
+    python benchmarks/bench_pipeline.py --rosters 1000 --baseline hasil_lama.json
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.face_recognition_model import FaceRecognitionModel  # noqa: E402
+from model.identity_index import IdentityIndex  # noqa: E402
+from model.model_snapshot import ModelSnapshot  # noqa: E402
+
+STAGES = (
+    'b64decode', 'imdecode_color', 'grayscale', 'imdecode_gray', 'quality',
+    'detect', 'resize', 'histogram', 'predict', 'label_lookup', 'total'
+)
+
+
+def identity_params(mahasiswa_id, seed):
+    """Parameter wajah tetap untuk satu identitas"""
+    rng = np.random.default_rng([seed, mahasiswa_id])
+    return {
+        'skin': int(rng.integers(110, 210)),
+        'face_w': float(rng.uniform(0.36, 0.44)),
+        'face_h': float(rng.uniform(0.46, 0.54)),
+        'eye_y': float(rng.uniform(0.36, 0.44)),
+        'eye_dx': float(rng.uniform(0.14, 0.2)),
+        'eye_r': float(rng.uniform(0.04, 0.06)),
+        'nose': float(rng.uniform(0.08, 0.14)),
+        'mouth_y': float(rng.uniform(0.66, 0.74)),
+        'mouth_w': float(rng.uniform(0.12, 0.2)),
+        'hair': int(rng.integers(10, 80)),
+        'texture': rng.integers(-25, 26, (12, 12)).astype(np.int16)
+    }
+
+
+def draw_face(params, size, rng):
+    """Gambar wajah grayscale size x size dengan noise capture"""
+    img = np.full((size, size), 90, np.uint8)
+    center = (size // 2, size // 2)
+    cv2.ellipse(img, center, (int(params['face_w'] * size), int(params['face_h'] * size)),
+                0, 0, 360, params['skin'], -1)
+    cv2.ellipse(img, (center[0], int(0.12 * size)), (int(0.4 * size), int(0.16 * size)),
+                0, 0, 360, params['hair'], -1)
+    eye_y = int(params['eye_y'] * size)
+    for sign in (-1, 1):
+        eye = (center[0] + sign * int(params['eye_dx'] * size), eye_y)
+        cv2.circle(img, eye, max(1, int(params['eye_r'] * size)), 30, -1)
+        cv2.line(img, (eye[0] - int(0.06 * size), eye_y - int(0.07 * size)),
+                 (eye[0] + int(0.06 * size), eye_y - int(0.07 * size)), 40, max(1, size // 40))
+    cv2.line(img, (center[0], eye_y + int(0.04 * size)),
+             (center[0], eye_y + int((0.04 + params['nose']) * size)), params['skin'] - 40, max(1, size // 50))
+    mouth_y = int(params['mouth_y'] * size)
+    cv2.ellipse(img, (center[0], mouth_y), (int(params['mouth_w'] * size), int(0.04 * size)),
+                0, 0, 180, 50, max(1, size // 40))
+
+    # Tekstur kulit per identitas + noise dan pencahayaan per capture
+    texture = cv2.resize(params['texture'].astype(np.float32), (size, size), interpolation=cv2.INTER_CUBIC)
+    light = rng.uniform(0.85, 1.15)
+    noisy = img.astype(np.float32) * light + texture + rng.normal(0, 4, img.shape)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def render_frame(params, rng, width=640, height=480):
+    """Frame kamera BGR dengan satu wajah, return (frame, box)"""
+    frame = np.empty((height, width), np.uint8)
+    gradient = np.linspace(60, 160, width, dtype=np.float32)
+    frame[:] = np.clip(gradient + rng.normal(0, 6, (height, width)), 0, 255).astype(np.uint8)
+    size = int(rng.integers(160, 240))
+    x = int(rng.integers(0, width - size))
+    y = int(rng.integers(0, height - size))
+    frame[y:y + size, x:x + size] = draw_face(params, size, rng)
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR), (x, y, size, size)
+
+
+def build_index(model, roster, seed, directory, chunk=512):
+    """Index roster sintetis sebagai .npy memory-mapped, return (index, detik)"""
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    dim = model.face_histogram(np.zeros((100, 100), np.uint8)).shape[0]
+    path = os.path.join(directory, f'index_{roster}.npy')
+    matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(roster, dim))
+    for offset in range(0, roster, chunk):
+        ids = range(offset, min(roster, offset + chunk))
+        rois = [draw_face(identity_params(i, seed), 100, rng) for i in ids]
+        # IdentityIndex menyimpan akar histogram (Hellinger)
+        matrix[offset:offset + len(rois)] = np.sqrt(model.face_histograms(rois))
+    matrix.flush()
+    del matrix
+
+    index = IdentityIndex.from_arrays(
+        np.load(path, mmap_mode='r'), np.arange(roster), shortlist=model.shortlist
+    )
+    return index, time.perf_counter() - start
+
+
+def timed(timings, stage, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    timings[stage].append(time.perf_counter() - start)
+    return result
+
+
+def run_frames(model, roster, frames, seed):
+    """Jalankan semua tahap untuk sejumlah frame, return (timings, ringkasan akurasi)"""
+    rng = np.random.default_rng([seed, roster])
+    timings = {stage: [] for stage in STAGES}
+    detected = correct = 0
+    detect_error = None
+
+    for _ in range(frames):
+        mahasiswa_id = int(rng.integers(0, roster))
+        frame, true_box = render_frame(identity_params(mahasiswa_id, seed), rng)
+        ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        payload = base64.b64encode(buf.tobytes())
+
+        start = time.perf_counter()
+        raw = timed(timings, 'b64decode', base64.b64decode, payload)
+        nparr = np.frombuffer(raw, np.uint8)
+        color = timed(timings, 'imdecode_color', cv2.imdecode, nparr, cv2.IMREAD_COLOR)
+        timed(timings, 'grayscale', cv2.cvtColor, color, cv2.COLOR_BGR2GRAY)
+        gray = timed(timings, 'imdecode_gray', cv2.imdecode, nparr, cv2.IMREAD_GRAYSCALE)
+        timed(timings, 'quality', model.check_quality, gray)
+
+        boxes = []
+        if detect_error is None:
+            try:
+                boxes = timed(timings, 'detect', model.detect_faces, gray)
+            except (cv2.error, RuntimeError) as e:
+                # cv2.error: cascade rusak; RuntimeError: tidak ada detector yang bisa dimuat
+                detect_error = str(e).strip()
+        if len(boxes):
+            detected += 1
+            x, y, w, h = boxes[0]
+        else:
+            # Wajah sintetis tidak terdeteksi: pakai kotak asli supaya tahap berikutnya tetap terukur
+            x, y, w, h = true_box
+
+        roi = timed(timings, 'resize', lambda: cv2.resize(gray[y:y + h, x:x + w], (100, 100)))
+        histogram = timed(timings, 'histogram', model.face_histogram, roi)
+        matches = timed(timings, 'predict', model.index.search, histogram, 1)
+        if matches:
+            timed(timings, 'label_lookup', model.names_by_id.get, matches[0][0])
+            correct += matches[0][0] == mahasiswa_id
+        timings['total'].append(time.perf_counter() - start)
+
+    summary = {
+        'frames': frames,
+        'detect_hit_rate': detected / frames if frames else 0.0,
+        'top1_accuracy': correct / frames if frames else 0.0,
+        'detect_error': detect_error
+    }
+    return timings, summary
+
+
+def summarize(values):
+    if not values:
+        return None
+    ms = np.array(values) * 1000
+    return {
+        'count': len(values),
+        'mean_ms': float(ms.mean()),
+        'median_ms': float(np.median(ms)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'max_ms': float(ms.max())
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Bandingkan median tiap tahap dengan hasil lama, return daftar regresi"""
+    regressions = []
+    old_rosters = {str(r['roster']): r for r in baseline.get('rosters', [])}
+    for r in results['rosters']:
+        old = old_rosters.get(str(r['roster']))
+        if not old:
+            continue
+        for stage, stats in r['stages'].items():
+            old_stats = old['stages'].get(stage)
+            if not stats or not old_stats or not old_stats['median_ms']:
+                continue
+            ratio = stats['median_ms'] / old_stats['median_ms']
+            if ratio > 1 + tolerance:
+                regressions.append((r['roster'], stage, old_stats['median_ms'], stats['median_ms'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rosters', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--frames', type=int, default=50, help='Jumlah frame query per roster')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Tulis hasil dalam format JSON ke file ini')
+    parser.add_argument('--baseline', help='File JSON hasil sebelumnya untuk dibandingkan')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Batas kenaikan median per tahap sebelum dianggap regresi (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    model = FaceRecognitionModel()
+    model.batcher = None
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'detector': model.detector.name if model.detector else None,
+            'shortlist': model.shortlist,
+            'frames': args.frames,
+            'seed': args.seed
+        },
+        'rosters': []
+    }
+
+    workdir = tempfile.mkdtemp(prefix='face_pipeline_bench_')
+    try:
+        for roster in args.rosters:
+            index, build_time = build_index(model, roster, args.seed, workdir)
+            model.snapshot = ModelSnapshot(index, range(roster), [f'Mahasiswa {i}' for i in range(roster)])
+            # Warm-up: page-in index dan inisialisasi detector
+            run_frames(model, roster, 2, args.seed + 1)
+            timings, summary = run_frames(model, roster, args.frames, args.seed)
+            results['rosters'].append(dict(
+                summary,
+                roster=roster,
+                build_s=build_time,
+                index_bytes=roster * model.index.matrix.shape[1] * 4,
+                stages={stage: summarize(timings[stage]) for stage in STAGES}
+            ))
+            model.snapshot = ModelSnapshot(IdentityIndex(shortlist=model.shortlist))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for r in results['rosters']:
+        print(f"\nRoster {r['roster']}: build {r['build_s']:.1f}s, "
+              f"deteksi {r['detect_hit_rate']:.0%}, top-1 {r['top1_accuracy']:.0%}")
+        if r['detect_error']:
+            print(f"  detector tidak tersedia: {r['detect_error'].splitlines()[-1]}")
+        print(f"  {'stage':<16}{'median (ms)':>12}{'p95 (ms)':>12}")
+        for stage, stats in r['stages'].items():
+            if stats:
+                print(f"  {stage:<16}{stats['median_ms']:>12.3f}{stats['p95_ms']:>12.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for roster, stage, old, new, ratio in regressions:
+            print(f"REGRESI roster {roster} {stage}: {old:.3f} -> {new:.3f} ms ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
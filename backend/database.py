@@ -23,6 +23,8 @@ class Mahasiswa(db.Model):
             'nama': self.nama,
             'jurusan': self.jurusan,
             'foto_wajah': self.foto_wajah,
+            # Dashboard memakai thumbnail, bukan file upload asli
+            'thumbnail_url': f'/api/mahasiswa/{self.id}/foto?variant=thumb' if self.foto_wajah else None,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
         }
 
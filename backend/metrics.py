@@ -0,0 +1,175 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Bucket latency (detik), dari 1 ms sampai 10 detik
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    ]
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [jumlah per bucket (+Inf di akhir), sum, count]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, [list(entry[0]), entry[1], entry[2]]) for key, entry in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Gauge:
+    """Metric yang nilainya dibaca dari callback saat /metrics diminta.
+
+    metric_type 'counter' untuk angka kumulatif yang dihitung di tempat lain
+    (misalnya hit/miss result cache).
+    """
+
+    def __init__(self, name, documentation, callback, metric_type='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.metric_type = metric_type
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Error reading metric {self.name}: {e}")
+            return []
+        if value is None:
+            return []
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}',
+            f'{self.name} {_format_value(value)}'
+        ]
+
+
+class MetricsRegistry:
+    """Registry metric sederhana dengan output format teks Prometheus.
+
+    Metric disimpan per proses; dengan beberapa proses server (gunicorn -w N)
+    setiap proses punya angka sendiri.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback, metric_type='gauge'):
+        return self.register(Gauge(name, documentation, callback, metric_type))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+# Latency per tahap pipeline (decode, quality, detect, resize, recognize, db)
+STAGE_LATENCY = metrics.histogram(
+    'absensi_stage_duration_seconds', 'Latency per tahap pipeline face recognition', ['stage']
+)
+# Latency per endpoint HTTP
+REQUEST_LATENCY = metrics.histogram(
+    'absensi_http_request_duration_seconds', 'Latency request HTTP per endpoint',
+    ['endpoint', 'method', 'status']
+)
+# Hasil check-in (success, duplicate, no_face, not_recognized, ...)
+CHECKIN_OUTCOMES = metrics.counter(
+    'absensi_checkin_total', 'Jumlah check-in per endpoint dan hasil', ['endpoint', 'outcome']
+)
+
+
+def observe_stages(timings):
+    """Catat dict tahap -> detik (hasil analyze_image) ke histogram tahap"""
+    if not timings:
+        return
+    for stage, seconds in timings.items():
+        STAGE_LATENCY.observe(seconds, stage=stage)
@@ -0,0 +1,214 @@
+import os
+import uuid
+
+# Crop wajah 100x100 disimpan di samping foto asli dengan akhiran ini
+FACE_CROP_SUFFIX = '_face.png'
+# Thumbnail berwarna untuk dashboard (sisi persegi, piksel) dan formatnya
+THUMBNAIL_SIZE = 160
+THUMBNAIL_FORMATS = ('webp', 'jpg')
+# Margin di sekitar kotak wajah untuk thumbnail, relatif terhadap ukuran wajah
+THUMBNAIL_MARGIN = 0.4
+
+
+def face_crop_path(foto_path):
+    """Path crop wajah ternormalisasi untuk satu foto pendaftaran"""
+    return os.path.splitext(foto_path)[0] + FACE_CROP_SUFFIX
+
+
+def thumbnail_path(foto_path, image_format):
+    """Path thumbnail (webp/jpg) untuk satu foto pendaftaran"""
+    return f"{os.path.splitext(foto_path)[0]}_thumb.{image_format}"
+
+
+def photo_files(foto_path):
+    """Semua file milik satu foto pendaftaran: asli, crop wajah dan thumbnail"""
+    return [foto_path, face_crop_path(foto_path)] + [
+        thumbnail_path(foto_path, image_format) for image_format in THUMBNAIL_FORMATS
+    ]
+
+
+def is_derived_file(name):
+    """True untuk crop wajah/thumbnail yang dibuat dari foto pendaftaran"""
+    stem = os.path.splitext(name)[0]
+    return name.endswith(FACE_CROP_SUFFIX) or stem.endswith('_thumb')
+
+
+def load_face_crop(foto_path):
+    """Baca crop wajah tersimpan (grayscale 100x100), None kalau tidak ada"""
+    import cv2
+
+    crop_path = face_crop_path(foto_path)
+    if not os.path.exists(crop_path):
+        return None
+    face_roi = cv2.imread(crop_path, cv2.IMREAD_GRAYSCALE)
+    if face_roi is None or face_roi.shape != (100, 100):
+        return None
+    return face_roi
+
+
+def decode_reduced(data, shape, min_side):
+    """Decode warna langsung ke ukuran kecil (IMREAD_REDUCED_COLOR_*).
+
+    Decoder JPEG bisa melewati sebagian besar piksel, jauh lebih murah
+    daripada decode penuh lalu resize. shape adalah ukuran asli (h, w);
+    return (gambar BGR, faktor pengecilan).
+    """
+    import cv2
+    import numpy as np
+
+    nparr = np.frombuffer(data, np.uint8)
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                         (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if min(shape[:2]) // factor >= min_side:
+            image = cv2.imdecode(nparr, flag)
+            if image is not None:
+                return image, factor
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR), 1
+
+
+def make_thumbnails(image, box=None, size=THUMBNAIL_SIZE):
+    """Encode thumbnail persegi dari gambar BGR, return dict format -> bytes.
+
+    Dengan box (x, y, w, h) thumbnail dipusatkan di wajah plus margin,
+    tanpa box dipakai bagian tengah gambar.
+    """
+    import cv2
+
+    height, width = image.shape[:2]
+    if box is not None:
+        x, y, w, h = box
+        side = int(max(w, h) * (1 + 2 * THUMBNAIL_MARGIN))
+        cx, cy = x + w // 2, y + h // 2
+    else:
+        side = min(width, height)
+        cx, cy = width // 2, height // 2
+    side = max(1, min(side, width, height))
+    left = min(max(0, cx - side // 2), width - side)
+    top = min(max(0, cy - side // 2), height - side)
+    crop = image[top:top + side, left:left + side]
+    thumb = cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA)
+
+    params = {
+        'webp': [cv2.IMWRITE_WEBP_QUALITY, 80],
+        'jpg': [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+    }
+    thumbnails = {}
+    for image_format in THUMBNAIL_FORMATS:
+        ok, encoded = cv2.imencode('.' + image_format, thumb, params[image_format])
+        if ok:
+            thumbnails[image_format] = encoded.tobytes()
+    return thumbnails
+
+
+def write_files(files):
+    """Tulis beberapa file (path, bytes) ke file sementara lalu rename semuanya.
+
+    Nama file sementara unik per pemanggil, jadi dua request yang menulis
+    file yang sama (misal ensure_thumbnails) tidak saling menimpa.
+    Kalau salah satu gagal, file yang sudah ditulis dihapus lagi.
+    """
+    suffix = f'.{uuid.uuid4().hex}.tmp'
+    written = []
+    try:
+        for path, content in files:
+            with open(path + suffix, 'wb') as f:
+                f.write(content)
+            written.append(path + suffix)
+        for path, _ in files:
+            os.replace(path + suffix, path)
+            written[written.index(path + suffix)] = path
+    except Exception:
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+
+def ensure_thumbnails(foto_path):
+    """Buat thumbnail untuk foto yang didaftarkan sebelum ada thumbnail.
+
+    Tanpa data deteksi, thumbnail diambil dari bagian tengah foto.
+    """
+    import cv2
+    import numpy as np
+
+    with open(foto_path, 'rb') as f:
+        nparr = np.frombuffer(f.read(), np.uint8)
+    image = cv2.imdecode(nparr, cv2.IMREAD_REDUCED_COLOR_2)
+    if image is None:
+        raise ValueError('Foto tidak dapat dibaca')
+    write_files([
+        (thumbnail_path(foto_path, image_format), content)
+        for image_format, content in make_thumbnails(image).items()
+    ])
+
+
+class EnrollmentPhoto:
+    """Foto pendaftaran yang di-decode dan dideteksi satu kali di memory.
+
+    Bytes upload dipakai langsung untuk validasi satu wajah, ROI 100x100
+    untuk model, dan isi file yang disimpan; foto tidak dibaca ulang dari disk.
+    """
+
+    def __init__(self, model, data, filename):
+        self.data = bytes(data)
+        self.filename = filename
+        self.face_roi = None
+        self.face_box = None
+        self.shape = None
+        # Kode alasan penolakan: invalid_image, no_face atau multiple_faces
+        self.reason = None
+        self.error = None
+
+        analysis = model.analyze(self.data)
+        if analysis.gray is None:
+            self.reason, self.error = 'invalid_image', 'Foto tidak dapat dibaca'
+        elif analysis.face_count == 0:
+            self.reason, self.error = 'no_face', 'Tidak ada wajah terdeteksi dalam foto'
+        elif analysis.face_count > 1:
+            self.reason, self.error = 'multiple_faces', 'Hanya satu wajah yang diperbolehkan dalam foto'
+        else:
+            self.face_roi = analysis.face_roi(0)
+            self.face_box = analysis.faces[0]
+            self.shape = analysis.gray.shape
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def thumbnails(self):
+        """Thumbnail wajah berwarna dari bytes upload (decode reduced, bukan resolusi penuh)"""
+        image, factor = decode_reduced(self.data, self.shape, THUMBNAIL_SIZE * 2)
+        box = tuple(v // factor for v in self.face_box)
+        return make_thumbnails(image, box)
+
+    def save(self, folder):
+        """Tulis foto asli, crop wajah dan thumbnail sekaligus, return path foto.
+
+        Semua ditulis ke file sementara lalu di-rename, jadi tidak ada foto
+        yang tersimpan tanpa crop dan thumbnail-nya (atau sebaliknya).
+        """
+        import cv2
+
+        os.makedirs(folder, exist_ok=True)
+        foto_path = os.path.join(folder, f"{uuid.uuid4()}_{self.filename}")
+        ok, crop = cv2.imencode('.png', self.face_roi)
+        if not ok:
+            raise ValueError('Gagal encode crop wajah')
+
+        files = [(foto_path, self.data), (face_crop_path(foto_path), crop.tobytes())]
+        files.extend(
+            (thumbnail_path(foto_path, image_format), content)
+            for image_format, content in self.thumbnails().items()
+        )
+        write_files(files)
+        return foto_path
+
+
+def remove_enrollment_photo(foto_path):
+    """Hapus foto pendaftaran beserta crop wajah dan thumbnail-nya"""
+    if not foto_path:
+        return
+    for path in photo_files(foto_path):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Lokasi lbpcascades OpenCV. Wheel opencv-python hanya membawa haarcascades,
+# jadi cari juga di folder data instalasi OpenCV sistem.
+LBP_CASCADE_NAME = 'lbpcascade_frontalface_improved.xml'
+LBP_CASCADE_DIRS = [
+    cv2.data.haarcascades,
+    os.path.join(os.path.dirname(os.path.dirname(cv2.data.haarcascades)), 'lbpcascades'),
+    '/usr/share/opencv4/lbpcascades',
+    '/usr/local/share/opencv4/lbpcascades',
+    '/usr/share/opencv/lbpcascades',
+    '/usr/local/share/opencv/lbpcascades',
+]
+
+DETECTOR_BACKENDS = ('haar', 'lbp', 'dnn')
+
+
+class FaceDetector:
+    """Interface detector wajah: detect(gray, min_size) -> list kotak (x, y, w, h).
+
+    Detector dipanggil dari banyak thread sekaligus (rebuild, request Flask),
+    jadi objek OpenCV-nya disimpan per thread.
+    """
+
+    name = None
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _create(self):
+        raise NotImplementedError
+
+    def _get(self):
+        """Objek OpenCV milik thread yang sedang berjalan"""
+        detector = getattr(self._local, 'detector', None)
+        if detector is None:
+            detector = self._create()
+            self._local.detector = detector
+        return detector
+
+    def detect(self, gray, min_size):
+        raise NotImplementedError
+
+
+class CascadeDetector(FaceDetector):
+    """Haar atau LBP cascade (CascadeClassifier)"""
+
+    def __init__(self, path, name='haar', scale_factor=1.1, min_neighbors=4):
+        super().__init__()
+        self.path = path
+        self.name = name
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        # Load sekali di thread pembuat, supaya file yang hilang/rusak langsung ketahuan
+        self._local.detector = self._create()
+        if self._local.detector.empty():
+            raise ValueError(f"Failed to load {name} cascade: {path}")
+
+    def _create(self):
+        return cv2.CascadeClassifier(self.path)
+
+    def detect(self, gray, min_size):
+        return self._get().detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_size, min_size)
+        )
+
+
+class DnnDetector(FaceDetector):
+    """Detector SSD lewat cv2.dnn, misalnya res10_300x300_ssd (Caffe) atau ONNX.
+
+    Model dibaca dari file lokal; input grayscale diduplikasi ke 3 channel.
+    """
+
+    name = 'dnn'
+
+    def __init__(self, model_path, config_path=None, confidence=0.5, input_size=300,
+                 mean=(104.0, 177.0, 123.0)):
+        super().__init__()
+        if not model_path or not os.path.exists(model_path):
+            raise ValueError(f"DNN face model not found: {model_path}")
+        self.model_path = model_path
+        self.config_path = config_path or ''
+        self.confidence = confidence
+        self.input_size = input_size
+        self.mean = mean
+        self._local.detector = self._create()
+
+    def _create(self):
+        return cv2.dnn.readNet(self.model_path, self.config_path)
+
+    def detect(self, gray, min_size):
+        height, width = gray.shape[:2]
+        image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        blob = cv2.dnn.blobFromImage(
+            image, 1.0, (self.input_size, self.input_size), self.mean, swapRB=False, crop=False
+        )
+        net = self._get()
+        net.setInput(blob)
+        # Output SSD: [1, 1, N, 7] = (batch, class, score, x1, y1, x2, y2) ternormalisasi
+        detections = net.forward().reshape(-1, 7)
+
+        boxes = []
+        for score, x1, y1, x2, y2 in detections[:, 2:7]:
+            if score < self.confidence:
+                continue
+            x1, y1 = max(0, int(x1 * width)), max(0, int(y1 * height))
+            x2, y2 = min(width, int(x2 * width)), min(height, int(y2 * height))
+            w, h = x2 - x1, y2 - y1
+            if w >= min_size and h >= min_size:
+                boxes.append((x1, y1, w, h))
+        return boxes
+
+
+def find_lbp_cascade():
+    """Path lbpcascade_frontalface_improved.xml, None kalau tidak ditemukan"""
+    path = os.getenv('FACE_LBP_CASCADE')
+    if path:
+        return path
+    for directory in LBP_CASCADE_DIRS:
+        candidate = os.path.join(directory, LBP_CASCADE_NAME)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def create_detector(backend='haar', scale_factor=1.1, min_neighbors=4):
+    """Buat detector berdasarkan nama backend ('haar', 'lbp' atau 'dnn').
+
+    Raise ValueError kalau backend tidak dikenal atau file modelnya tidak ada
+    atau tidak bisa dibaca.
+    """
+    if backend == 'haar':
+        path = os.getenv('FACE_HAAR_CASCADE', cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        return CascadeDetector(path, 'haar', scale_factor, min_neighbors)
+
+    if backend == 'lbp':
+        path = find_lbp_cascade()
+        if not path or not os.path.exists(path):
+            raise ValueError("LBP cascade not found, set FACE_LBP_CASCADE")
+        return CascadeDetector(path, 'lbp', scale_factor, min_neighbors)
+
+    if backend == 'dnn':
+        return DnnDetector(
+            os.getenv('FACE_DNN_MODEL'),
+            os.getenv('FACE_DNN_CONFIG'),
+            confidence=float(os.getenv('FACE_DNN_CONFIDENCE', '0.5')),
+            input_size=int(os.getenv('FACE_DNN_INPUT_SIZE', '300'))
+        )
+
+    raise ValueError(f"Unknown face detector backend: {backend}")
+
+
+def compare_detectors(images, backends=DETECTOR_BACKENDS, min_size=40, repeat=1):
+    """Bandingkan latency dan hit rate tiap backend pada daftar gambar grayscale.
+
+    Setiap gambar dianggap berisi tepat satu wajah; hit = minimal satu wajah
+    terdeteksi. Backend yang tidak tersedia dilaporkan dengan 'error'.
+    """
+    results = {}
+    for backend in backends:
+        try:
+            detector = create_detector(backend)
+        except Exception as e:
+            results[backend] = {'error': str(e)}
+            continue
+
+        timings = []
+        hits = 0
+        multiple = 0
+        try:
+            for gray in images:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    boxes = detector.detect(gray, min_size)
+                    timings.append(time.perf_counter() - start)
+                hits += len(boxes) > 0
+                multiple += len(boxes) > 1
+        except Exception as e:
+            results[backend] = {'error': str(e)}
+            continue
+
+        timings_ms = np.array(timings) * 1000 if timings else np.zeros(1)
+        results[backend] = {
+            'images': len(images),
+            'hit_rate': hits / len(images) if images else 0.0,
+            'multiple_faces': multiple,
+            'latency_median_ms': float(np.median(timings_ms)),
+            'latency_p95_ms': float(np.percentile(timings_ms, 95))
+        }
+    return results
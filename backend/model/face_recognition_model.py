@@ -4,24 +4,161 @@ import os
 from PIL import Image
 import io
 import base64
-import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from model.enrollment import load_face_crop
+from model.face_detector import create_detector
+from model.identity_index import IdentityIndex, lbp_histogram, lbp_histograms
+from model.recognition_batcher import MicroBatcher
+from model.result_cache import ResultCache, perceptual_hash
+from model.template_store import TemplateStore
+from model.model_snapshot import ModelSnapshot
+from model.model_store import ModelStore, DEFAULT_MODEL_DIR
+
+# Pesan error untuk frame yang ditolak quality gate
+QUALITY_MESSAGES = {
+    'too_dark': "Image too dark, please retake the photo",
+    'too_bright': "Image overexposed, please retake the photo",
+    'low_contrast': "Image contrast too low, please retake the photo",
+    'blurry': "Image too blurry, please retake the photo"
+}
 
 class FaceRecognitionModel:
     def __init__(self):
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         self.recognizer = cv2.face.LBPHFaceRecognizer_create()
         self.known_face_encodings = []
-        self.known_face_names = []
-        self.known_face_ids = []
-        self.model_file = 'face_model.yml'
-        self.labels_file = 'face_labels.pkl'
+        # Snapshot model yang dibaca recognition: index histogram vectorized,
+        # lookup nama O(1) dan generation; diganti utuh, tidak pernah diubah
+        self.shortlist = int(os.getenv('FACE_INDEX_SHORTLIST', '64'))
+        if self.shortlist < 1:
+            print(f"FACE_INDEX_SHORTLIST={self.shortlist} tidak valid (minimal 1), memakai 64")
+            self.shortlist = 64
+        self.snapshot = ModelSnapshot(IdentityIndex(shortlist=self.shortlist))
+        # Artefak model berversi; generation naik setiap ada perubahan model
+        self.store = ModelStore(os.getenv('FACE_MODEL_DIR', DEFAULT_MODEL_DIR))
+        self.template_store = TemplateStore(self.store.path('face_templates.npz'))
+        # Format model penuh: 'npy' (biner, memory-mapped) atau 'yml' (LBPH lama)
+        self.model_format = os.getenv('FACE_MODEL_FORMAT', 'npy')
+        # True kalau recognizer LBPH memegang semua histogram (model dari yml)
+        self.recognizer_trained = False
+        self.max_delta_records = 500
         self.model_loaded = False
+        self.base_generation = None
+        self.applied_delta = 0
+        self.applied_delta_size = 0
+        
+        # Hot-reload: cek manifest paling sering tiap reload_interval detik
+        self.reload_interval = float(os.getenv('FACE_MODEL_RELOAD_INTERVAL', '1'))
+        self._last_reload_check = 0.0
+        self._manifest_stamp = None
+        self._reload_thread = None
+        # Serialisasi perubahan model di dalam proses ini (recognition tidak memakai lock ini)
+        self._update_lock = threading.RLock()
+        # Training besar (bulk enrollment) dijalankan di satu thread background
+        self._trainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='face-trainer')
+        self._training_lock = threading.Lock()
+        self.training_pending = 0
+        
+        # Setting deteksi wajah (trade-off latency vs recall)
+        # detect_downscale: deteksi dilakukan pada gambar yang diperkecil N kali,
+        # kotak wajah kemudian dipetakan kembali ke resolusi penuh untuk crop ROI
+        self.detect_downscale = int(os.getenv('FACE_DETECT_DOWNSCALE', '1'))
+        self.detect_scale_factor = float(os.getenv('FACE_DETECT_SCALE_FACTOR', '1.1'))
+        self.detect_min_neighbors = int(os.getenv('FACE_DETECT_MIN_NEIGHBORS', '4'))
+        # Ukuran wajah minimum dalam piksel resolusi penuh
+        self.detect_min_size = int(os.getenv('FACE_DETECT_MIN_SIZE', '40'))
+        # Backend detector: 'haar' (default), 'lbp' (lebih cepat) atau 'dnn'
+        self.detector = self._create_detector(os.getenv('FACE_DETECTOR', 'haar'))
+        
+        # Quality gate sebelum deteksi: tolak frame gelap, silau, low contrast, blur
+        self.quality_gate = os.getenv('FACE_QUALITY_GATE', '1') == '1'
+        self.quality_width = 160
+        self.quality_min_brightness = float(os.getenv('FACE_QUALITY_MIN_BRIGHTNESS', '40'))
+        self.quality_max_brightness = float(os.getenv('FACE_QUALITY_MAX_BRIGHTNESS', '220'))
+        self.quality_min_contrast = float(os.getenv('FACE_QUALITY_MIN_CONTRAST', '15'))
+        self.quality_min_sharpness = float(os.getenv('FACE_QUALITY_MIN_SHARPNESS', '15'))
+        
+        # Cache hasil untuk frame yang hampir identik (retry / klik berulang)
+        self.result_cache = ResultCache(
+            max_size=int(os.getenv('FACE_RESULT_CACHE_SIZE', '256')),
+            ttl=float(os.getenv('FACE_RESULT_CACHE_TTL', '5'))
+        )
+        
+        # Micro-batching recognition untuk request yang datang bersamaan
+        # (window dalam milidetik, 0 = nonaktif)
+        batch_window = float(os.getenv('FACE_BATCH_WINDOW_MS', '0')) / 1000
+        self.batcher = None
+        if batch_window > 0:
+            self.batcher = MicroBatcher(
+                self._recognize_batch, batch_window, int(os.getenv('FACE_BATCH_MAX', '32'))
+            )
+        # Cache index kecil per roster kelas/jurusan (batas total dalam MB)
+        self.roster_cache_bytes = int(os.getenv('FACE_ROSTER_CACHE_MB', '256')) * 1024 * 1024
+        self._roster_indexes = {}
+        self._roster_cache_size = 0
+        
+        # Jumlah thread untuk rebuild model dari foto
+        self.rebuild_workers = int(os.getenv('FACE_REBUILD_WORKERS', str(os.cpu_count() or 4)))
+        self.rebuild_stats = None
+    
+    @property
+    def index(self):
+        return self.snapshot.index
+    
+    @property
+    def names_by_id(self):
+        return self.snapshot.names_by_id
+    
+    @property
+    def known_face_ids(self):
+        return self.snapshot.known_face_ids
+    
+    @property
+    def known_face_names(self):
+        return self.snapshot.known_face_names
+    
+    @property
+    def generation(self):
+        return self.snapshot.generation
+    
+    def _publish(self, snapshot, manifest=None):
+        """Ganti snapshot aktif dengan satu assignment (atomik untuk thread lain)"""
+        if manifest is not None:
+            snapshot = snapshot.with_generation(manifest['generation'])
+            self._set_generation(manifest)
+        self.snapshot = snapshot
+    
+    def train_in_background(self, func, *args):
+        """Jalankan training di thread trainer, return future.
+        
+        Recognition tetap memakai snapshot lama sampai training selesai dan
+        snapshot baru dipublish.
+        """
+        with self._training_lock:
+            self.training_pending += 1
+        future = self._trainer.submit(func, *args)
+        future.add_done_callback(self._training_done)
+        return future
+    
+    def _training_done(self, future):
+        with self._training_lock:
+            self.training_pending -= 1
+        if future.exception() is not None:
+            print(f"Error in background training: {future.exception()}")
     
     def load_known_faces(self):
         """Load semua wajah yang sudah terdaftar dari database"""
         if self.model_loaded:
             return
-            
+        
+        # Warm-up dan request pertama bisa datang bersamaan, cukup satu yang load
+        with self._update_lock:
+            if not self.model_loaded:
+                self._load_known_faces()
+    
+    def _load_known_faces(self):
         try:
             # Try to load existing model first
             if self.load_model():
@@ -37,169 +174,723 @@ class FaceRecognitionModel:
         
         faces = []
         labels = []
+        names = []
+        
+        # Template yang sudah pernah dideteksi tidak perlu dideteksi ulang
+        self.template_store.load()
         
-        for mahasiswa in mahasiswa_list:
-            if mahasiswa.foto_wajah and os.path.exists(mahasiswa.foto_wajah):
-                try:
-                    # Load dan process wajah
-                    image = cv2.imread(mahasiswa.foto_wajah)
-                    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                    face_locations = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-                    
-                    if len(face_locations) > 0:
-                        (x, y, w, h) = face_locations[0]
-                        face_roi = gray[y:y+h, x:x+w]
-                        face_roi = cv2.resize(face_roi, (100, 100))
-                        
-                        faces.append(face_roi)
-                        labels.append(mahasiswa.id)
-                        
-                        self.known_face_names.append(mahasiswa.nama)
-                        self.known_face_ids.append(mahasiswa.id)
-                        print(f"Loaded face for: {mahasiswa.nama}")
-                except Exception as e:
-                    print(f"Error loading face for {mahasiswa.nama}: {e}")
-        
-        # Train the recognizer if we have faces
+        jobs = [
+            (mahasiswa.id, mahasiswa.nama, mahasiswa.foto_wajah)
+            for mahasiswa in mahasiswa_list
+            if mahasiswa.foto_wajah and os.path.exists(mahasiswa.foto_wajah)
+        ]
+        results = self.extract_templates(jobs)
+        
+        for mahasiswa_id, nama, _ in jobs:
+            checksum, face_roi, cached = results.get(mahasiswa_id, (None, None, False))
+            if face_roi is None:
+                continue
+            if not cached:
+                self.template_store.put(mahasiswa_id, checksum, face_roi)
+            
+            faces.append(face_roi)
+            labels.append(mahasiswa_id)
+            names.append(nama)
+        
+        self.template_store.retain(labels)
+        self.template_store.save()
+        
+        # Train the recognizer if we have faces (snapshot baru, lalu publish)
         if faces and labels:
-            self.recognizer.train(faces, np.array(labels))
-            self.save_model()
-            self.model_loaded = True
+            with self._update_lock:
+                self.save_model(self.train_faces(faces, labels, names))
+                self.model_loaded = True
+    
+    def extract_template(self, mahasiswa_id, path):
+        """Ambil ROI wajah dari satu foto, pakai template cache kalau checksum sama"""
+        checksum = self.template_store.file_checksum(path)
+        face_roi = self.template_store.get(mahasiswa_id, checksum)
+        if face_roi is not None:
+            return checksum, face_roi, True
+        
+        # Crop yang ditulis saat pendaftaran, tidak perlu decode dan deteksi ulang
+        face_roi = load_face_crop(path)
+        if face_roi is not None:
+            return checksum, face_roi, False
+        
+        analysis = self.analyze(path)
+        if analysis.face_count > 0:
+            return checksum, analysis.face_roi(0), False
+        return checksum, None, False
+    
+    def extract_templates(self, jobs):
+        """Ekstrak wajah dari banyak foto secara paralel dengan antrian terbatas.
+        
+        jobs berisi tuple (mahasiswa_id, nama, path). Return dict
+        mahasiswa_id -> (checksum, face_roi, cached).
+        """
+        results = {}
+        stats = {'total': len(jobs), 'processed': 0, 'failed': 0, 'elapsed': 0.0}
+        start = time.monotonic()
+        last_report = start
+        max_pending = max(1, self.rebuild_workers) * 4
+        
+        with ThreadPoolExecutor(max_workers=max(1, self.rebuild_workers)) as executor:
+            pending = {}
+            queue = iter(jobs)
+            
+            while True:
+                # Isi antrian sampai batas, supaya foto tidak dibaca semua sekaligus
+                for mahasiswa_id, nama, path in queue:
+                    future = executor.submit(self.extract_template, mahasiswa_id, path)
+                    pending[future] = (mahasiswa_id, nama)
+                    if len(pending) >= max_pending:
+                        break
+                
+                if not pending:
+                    break
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    mahasiswa_id, nama = pending.pop(future)
+                    stats['processed'] += 1
+                    try:
+                        result = future.result()
+                        if result[1] is None:
+                            stats['failed'] += 1
+                            print(f"No face detected for: {nama}")
+                        else:
+                            results[mahasiswa_id] = result
+                    except Exception as e:
+                        stats['failed'] += 1
+                        print(f"Error loading face for {nama}: {e}")
+                
+                now = time.monotonic()
+                if now - last_report >= 2:
+                    last_report = now
+                    print(f"Rebuild progress: {stats['processed']}/{stats['total']} "
+                          f"processed, {stats['failed']} failed, {now - start:.1f}s")
+        
+        stats['elapsed'] = time.monotonic() - start
+        self.rebuild_stats = stats
+        print(f"Rebuild selesai: {stats['processed']}/{stats['total']} processed, "
+              f"{stats['failed']} failed, {stats['elapsed']:.1f}s")
+        return results
     
-    def save_model(self):
-        """Save trained model"""
+    def save_model(self, snapshot=None):
+        """Save snapshot (default: yang aktif) sebagai generation baru lalu publish"""
+        snapshot = snapshot or self.snapshot
+        manifest = None
         try:
-            self.recognizer.save(self.model_file)
-            with open(self.labels_file, 'wb') as f:
-                pickle.dump({
-                    'names': self.known_face_names,
-                    'ids': self.known_face_ids
-                }, f)
+            with self._update_lock, self.store.lock():
+                # YAML hanya bisa ditulis kalau recognizer memegang semua histogram
+                model_format = 'yml' if self.model_format == 'yml' and self.recognizer_trained else 'npy'
+                manifest = self.store.write_base(
+                    self.recognizer, snapshot.index,
+                    snapshot.known_face_names, snapshot.known_face_ids,
+                    model_format=model_format
+                )
         except Exception as e:
             print(f"Error saving model: {e}")
+        # Gagal simpan tetap publish, model in-memory tetap bisa dipakai
+        self._publish(snapshot, manifest)
+    
+    def compact(self):
+        """Gabungkan delta log ke model penuh, hanya kalau model ini yang terbaru"""
+        with self._update_lock, self.store.lock():
+            manifest = self.store.read_manifest()
+            if manifest and manifest['generation'] == self.generation:
+                self.save_model()
+    
+    def save_delta(self, snapshot, face_roi, mahasiswa_id, nama):
+        """Append satu wajah baru ke delta log tanpa menulis ulang model penuh,
+        lalu publish snapshot yang sudah memuat wajah itu.
+        
+        Caller harus memegang self.store.lock().
+        """
+        manifest = None
+        try:
+            manifest = self.store.append_delta({
+                'face': face_roi,
+                'id': mahasiswa_id,
+                'name': nama
+            })
+        except Exception as e:
+            print(f"Error saving model delta: {e}")
+
+        # Delta log terlalu panjang: compact sekarang, selagi lock masih dipegang
+        if manifest and manifest['delta_count'] > self.max_delta_records:
+            self.save_model(snapshot)
+            return
+        self._publish(snapshot, manifest)
+    
+    def _set_generation(self, manifest):
+        self.base_generation = manifest['base_generation']
+        self.applied_delta = manifest['delta_count']
+        self.applied_delta_size = self.store.delta_size(manifest)
+        self._manifest_stamp = self.store.manifest_stamp()
+    
+    def _read_artifacts(self, manifest):
+        """Baca satu snapshot model dari artefak yang ditunjuk manifest"""
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        names, ids, index = self.store.read_base(manifest, recognizer, shortlist=self.shortlist)
+        recognizer_trained = index is None
+        
+        if recognizer_trained:
+            index = self._index_from_recognizer(recognizer)
+        
+        # Replay wajah yang ditambahkan setelah model penuh terakhir disimpan
+        records = self.store.read_delta(manifest)
+        if records:
+            faces = [r['face'] for r in records]
+            labels = [r['id'] for r in records]
+            if recognizer_trained:
+                recognizer.update(faces, np.array(labels))
+            index.add(np.vstack([self.face_histogram(f) for f in faces]), labels)
+            names.extend(r['name'] for r in records)
+            ids.extend(labels)
+        
+        return recognizer, names, ids, index, recognizer_trained
     
-    def load_model(self):
-        """Load trained model"""
+    def _apply_delta(self, manifest):
+        """Terapkan record delta yang belum ada di model ini (incremental)"""
+        records = self.store.read_delta(
+            manifest, start=self.applied_delta, offset=self.applied_delta_size
+        )
+        snapshot = self.snapshot
+        for r in records:
+            if r['id'] not in snapshot:
+                snapshot = self.update_face(snapshot, r['face'], r['id'], r['name'])
+        self._publish(snapshot, manifest)
+    
+    def load_model(self, manifest=None):
+        """Load trained model dari generation terbaru"""
         try:
-            if os.path.exists(self.model_file):
-                self.recognizer.read(self.model_file)
-                with open(self.labels_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.known_face_names = data['names']
-                    self.known_face_ids = data['ids']
-                return True
+            manifest = manifest or self.store.read_manifest()
+            if manifest is None:
+                return False
+            
+            recognizer, names, ids, index, recognizer_trained = self._read_artifacts(manifest)
+            
+            # Snapshot baru dibangun penuh dulu, baru dipublish
+            self.recognizer = recognizer
+            self.recognizer_trained = recognizer_trained
+            self._publish(ModelSnapshot(index, ids, names), manifest)
+            
+            # Compact delta log kalau sudah terlalu panjang
+            if manifest['delta_count'] > self.max_delta_records:
+                self.compact()
+            return True
         except Exception as e:
             print(f"Error loading model: {e}")
         return False
     
+    def refresh(self):
+        """Sinkronkan model dengan generation terbaru di disk (blocking)"""
+        manifest = self.store.read_manifest()
+        if manifest is None or manifest['generation'] == self.generation:
+            return False
+        
+        if self.model_loaded and manifest['base_generation'] == self.base_generation:
+            self._apply_delta(manifest)
+        else:
+            self.model_loaded = self.load_model(manifest) or self.model_loaded
+        return True
+    
+    def maybe_reload(self):
+        """Cek murah apakah proses lain sudah menulis model baru.
+        
+        Paling banyak satu stat per reload_interval; kalau generation berubah,
+        model baru di-load di background thread dan request tetap jalan
+        dengan model lama sampai model baru siap.
+        """
+        now = time.monotonic()
+        if now - self._last_reload_check < self.reload_interval:
+            return
+        self._last_reload_check = now
+        
+        stamp = self.store.manifest_stamp()
+        if stamp is None or stamp == self._manifest_stamp:
+            return
+        if self._reload_thread is not None and self._reload_thread.is_alive():
+            return
+        
+        self._reload_thread = threading.Thread(target=self._background_reload, daemon=True)
+        self._reload_thread.start()
+    
+    def _background_reload(self):
+        try:
+            with self._update_lock:
+                if self.refresh():
+                    print(f"Face model reloaded: generation {self.generation}")
+        except Exception as e:
+            print(f"Error reloading model: {e}")
+    
+    def _index_from_recognizer(self, recognizer):
+        """Identity index dari histogram LBPH yang sudah ditrain"""
+        index = IdentityIndex(shortlist=self.shortlist)
+        histograms = recognizer.getHistograms()
+        if histograms:
+            index.add(
+                np.vstack([h.reshape(1, -1) for h in histograms]),
+                recognizer.getLabels().ravel()
+            )
+        return index
+    
+    def train_faces(self, faces, labels, names):
+        """Train model penuh dari ROI wajah, return snapshot baru (belum dipublish)"""
+        if self.model_format == 'yml':
+            # Recognizer LBPH hanya dipakai untuk menulis yml, bukan untuk recognition
+            self.recognizer.train(faces, np.array(labels))
+            self.recognizer_trained = True
+            index = self._index_from_recognizer(self.recognizer)
+        else:
+            # Format biner cukup histogram di index, recognizer LBPH tidak dipakai
+            self.recognizer_trained = False
+            index = IdentityIndex(shortlist=self.shortlist)
+            index.add(np.vstack([self.face_histogram(f) for f in faces]), labels)
+        return ModelSnapshot(index, labels, names)
+    
+    def update_face(self, snapshot, face_roi, mahasiswa_id, nama):
+        """Snapshot + satu wajah baru (incremental), snapshot lama tidak berubah"""
+        if self.recognizer_trained:
+            self.recognizer.update([face_roi], np.array([mahasiswa_id]))
+        return snapshot.with_faces(self.face_histogram(face_roi), [mahasiswa_id], [nama])
+    
+    def face_histogram(self, face_roi):
+        """Histogram LBP dengan parameter yang sama dengan recognizer"""
+        return lbp_histogram(
+            face_roi,
+            radius=self.recognizer.getRadius(),
+            neighbors=self.recognizer.getNeighbors(),
+            grid_x=self.recognizer.getGridX(),
+            grid_y=self.recognizer.getGridY()
+        )
+    
+    def face_histograms(self, face_rois):
+        """face_histogram untuk banyak ROI sekaligus, return matrix (N, dim)"""
+        return lbp_histograms(
+            np.asarray(face_rois),
+            radius=self.recognizer.getRadius(),
+            neighbors=self.recognizer.getNeighbors(),
+            grid_x=self.recognizer.getGridX(),
+            grid_y=self.recognizer.getGridY()
+        )
+    
+    def search_face(self, face_roi, k=1):
+        """Top-k kandidat identitas untuk satu ROI wajah 100x100"""
+        snapshot = self.snapshot
+        matches = snapshot.index.search(self.face_histogram(face_roi), k=k)
+        return [
+            {
+                'mahasiswa_id': mahasiswa_id,
+                'nama': snapshot.names_by_id.get(mahasiswa_id),
+                'distance': distance
+            }
+            for mahasiswa_id, distance in matches
+        ]
+    
     def add_face(self, image_path, mahasiswa_id, nama):
         """Tambah wajah baru ke database"""
         try:
-            # Load dan process wajah baru
-            image = cv2.imread(image_path)
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            face_locations = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-            
-            if len(face_locations) > 0:
-                (x, y, w, h) = face_locations[0]
-                face_roi = gray[y:y+h, x:x+w]
-                face_roi = cv2.resize(face_roi, (100, 100))
-                
-                # Retrain the model with new face
-                self.recognizer.train([face_roi], np.array([mahasiswa_id]))
-                
-                self.known_face_names.append(nama)
-                self.known_face_ids.append(mahasiswa_id)
-                
-                self.save_model()
-                print(f"Added new face for: {nama}")
-                return True
-            else:
+            # Load dan process wajah baru (di luar lock)
+            analysis = self.analyze(image_path)
+            if analysis.face_count == 0:
                 print("No face detected in the image")
                 return False
+            return self.add_face_roi(analysis.face_roi(0), mahasiswa_id, nama)
         except Exception as e:
             print(f"Error adding face: {e}")
             return False
     
-    def recognize_face(self, image_data):
-        """Recognize wajah dari image data (base64 atau file path)"""
-        # Load faces if not loaded yet
+    def add_face_roi(self, face_roi, mahasiswa_id, nama):
+        """Tambah wajah baru dari ROI 100x100 yang sudah diekstrak"""
+        # Pastikan model lama sudah dimuat supaya wajah lain tidak hilang
         if not self.model_loaded:
             self.load_known_faces()
-            
+
         try:
-            # Handle base64 image data
-            if isinstance(image_data, str) and image_data.startswith('data:image'):
-                # Decode base64 image
-                image_data = image_data.split(',')[1]
-                image_bytes = base64.b64decode(image_data)
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            else:
-                # Handle file path
-                image = cv2.imread(image_data)
+            with self._update_lock, self.store.lock():
+                # Ikuti dulu perubahan dari proses lain supaya tidak tertimpa
+                self.refresh()
+                
+                # Rebuild dari database bisa saja sudah memuat mahasiswa ini
+                if mahasiswa_id in self.snapshot:
+                    return True
+                
+                if self.model_loaded:
+                    # Update incremental: histogram lama tetap dipakai,
+                    # hanya wajah baru yang ditambahkan dan disimpan ke delta log
+                    snapshot = self.update_face(self.snapshot, face_roi, mahasiswa_id, nama)
+                    self.save_delta(snapshot, face_roi, mahasiswa_id, nama)
+                else:
+                    # Belum ada model sama sekali, train dari wajah pertama
+                    self.save_model(self.train_faces([face_roi], [mahasiswa_id], [nama]))
+                    self.model_loaded = True
             
-            if image is None:
-                return None, "Invalid image data"
+            print(f"Added new face for: {nama}")
+            return True
+        except Exception as e:
+            print(f"Error adding face: {e}")
+            return False
+    
+    def add_faces(self, face_rois, mahasiswa_ids, names, chunk_size=512):
+        """Tambah banyak wajah sekaligus (bulk enrollment).
+        
+        Histogram dihitung per chunk lalu dimasukkan ke index dalam satu
+        langkah, dan model disimpan sekali sebagai satu generation baru,
+        bukan satu delta per mahasiswa. Return jumlah wajah yang ditambahkan.
+        """
+        if not self.model_loaded:
+            self.load_known_faces()
+        
+        try:
+            with self._update_lock, self.store.lock():
+                self.refresh()
+                
+                # Rebuild dari database bisa saja sudah memuat sebagian mahasiswa
+                new_faces = [
+                    (face_roi, mahasiswa_id, nama)
+                    for face_roi, mahasiswa_id, nama in zip(face_rois, mahasiswa_ids, names)
+                    if mahasiswa_id not in self.snapshot
+                ]
+                if not new_faces:
+                    return 0
+                
+                rois = [face_roi for face_roi, _, _ in new_faces]
+                ids = [mahasiswa_id for _, mahasiswa_id, _ in new_faces]
+                new_names = [nama for _, _, nama in new_faces]
+                
+                if self.model_loaded:
+                    if self.recognizer_trained:
+                        self.recognizer.update(rois, np.array(ids))
+                    histograms = np.vstack([
+                        self.face_histograms(rois[i:i + chunk_size])
+                        for i in range(0, len(rois), chunk_size)
+                    ])
+                    snapshot = self.snapshot.with_faces(histograms, ids, new_names)
+                else:
+                    snapshot = self.train_faces(rois, ids, new_names)
+                    self.model_loaded = True
+                self.save_model(snapshot)
             
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            print(f"Added {len(new_faces)} new faces")
+            return len(new_faces)
+        except Exception as e:
+            print(f"Error adding faces: {e}")
+            return 0
+    
+    def decode_image(self, image_data, flags=cv2.IMREAD_COLOR):
+        """Decode image data (bytes, base64 atau file path) dengan flag imread"""
+        if isinstance(image_data, (bytes, bytearray, memoryview)):
+            # Bytes mentah dari upload, dibungkus NumPy tanpa copy
+            nparr = np.frombuffer(image_data, np.uint8)
+            return cv2.imdecode(nparr, flags)
+        
+        if isinstance(image_data, str) and image_data.startswith('data:image'):
+            # Decode base64 image
+            image_data = image_data.split(',')[1]
+            image_bytes = base64.b64decode(image_data)
+            nparr = np.frombuffer(image_bytes, np.uint8)
+            return cv2.imdecode(nparr, flags)
+        
+        # Handle file path
+        return cv2.imread(image_data, flags)
+    
+    def _create_detector(self, backend):
+        """Detector sesuai konfigurasi, fallback ke cascade lain kalau backend tidak tersedia.
+        
+        Return None kalau tidak ada detector yang bisa dimuat; detect_faces
+        lalu gagal dengan pesan yang jelas.
+        """
+        for candidate in [backend] + [b for b in ('haar', 'lbp') if b != backend]:
+            try:
+                return create_detector(candidate, self.detect_scale_factor, self.detect_min_neighbors)
+            except Exception as e:
+                print(f"Error loading face detector '{candidate}': {e}")
+        return None
+    
+    def detect_faces(self, gray):
+        """Jalankan detector wajah, kotak wajah dalam koordinat resolusi penuh"""
+        scale = max(1, self.detect_downscale)
+        detect_gray = gray
+        if scale > 1:
+            height, width = gray.shape[:2]
+            detect_gray = cv2.resize(
+                gray, (max(1, width // scale), max(1, height // scale)),
+                interpolation=cv2.INTER_AREA
+            )
+        
+        if self.detector is None:
+            raise RuntimeError('Face detector tidak tersedia (cascade/model detector tidak ditemukan)')
+        min_size = max(1, self.detect_min_size // scale)
+        face_locations = self.detector.detect(detect_gray, min_size)
+        
+        if scale == 1 or len(face_locations) == 0:
+            return face_locations
+        
+        # Petakan kotak dari gambar kecil ke resolusi penuh
+        height, width = gray.shape[:2]
+        boxes = []
+        for (x, y, w, h) in face_locations:
+            x, y = x * scale, y * scale
+            w, h = min(w * scale, width - x), min(h * scale, height - y)
+            boxes.append((x, y, w, h))
+        return boxes
+    
+    def analyze(self, image_data):
+        """Decode dan deteksi wajah satu kali, hasilnya bisa dipakai berulang"""
+        return FrameAnalysis(self, image_data)
+    
+    def check_quality(self, gray):
+        """Cek cepat kualitas frame sebelum deteksi wajah.
+        
+        Dihitung pada versi kecil gambar (lebar ~quality_width px), jadi
+        jauh lebih murah daripada Haar cascade. Return dict dengan 'ok',
+        'reason' (None, 'too_dark', 'too_bright', 'low_contrast', 'blurry')
+        dan nilai pengukurannya.
+        """
+        height, width = gray.shape[:2]
+        scale = max(1, width // self.quality_width)
+        small = gray
+        if scale > 1:
+            small = cv2.resize(gray, (width // scale, height // scale), interpolation=cv2.INTER_AREA)
+        
+        mean, stddev = cv2.meanStdDev(small)
+        brightness, contrast = float(mean[0][0]), float(stddev[0][0])
+        sharpness = float(cv2.Laplacian(small, cv2.CV_32F).var())
+        
+        reason = None
+        if brightness < self.quality_min_brightness:
+            reason = 'too_dark'
+        elif brightness > self.quality_max_brightness:
+            reason = 'too_bright'
+        elif contrast < self.quality_min_contrast:
+            reason = 'low_contrast'
+        elif sharpness < self.quality_min_sharpness:
+            reason = 'blurry'
+        
+        return {
+            'ok': reason is None,
+            'reason': reason,
+            'brightness': brightness,
+            'contrast': contrast,
+            'sharpness': sharpness
+        }
+    
+    def analyze_image(self, image_data, recognize=True, check_quality=True, roster=None):
+        """Deteksi, hitung, dan (opsional) kenali wajah dari satu kali decode.
+        
+        Dengan check_quality, frame yang gelap/terlalu terang/blur ditolak
+        sebelum deteksi dan 'quality' berisi alasannya. Frame yang hampir
+        identik dengan frame sebelumnya memakai hasil dari result_cache
+        ('cache' bernilai 'hit' atau 'miss'). roster membatasi recognition ke
+        id mahasiswa tertentu.
+        """
+        try:
+            analysis = self.analyze(image_data)
+        except Exception as e:
+            return {
+                'face_detected': False,
+                'face_count': 0,
+                'recognition': None,
+                'error': f"Error in face recognition: {str(e)}",
+                'quality': None,
+                'timings': {}
+            }
+        
+        roster = self.roster_key(roster)
+        if not self.result_cache.enabled or analysis.gray is None:
+            result = self._analyze_frame(analysis, recognize, check_quality, roster)
+            return dict(result, timings=analysis.timings)
+        
+        if recognize and self.model_loaded:
+            # Generation harus terbaru sebelum dipakai sebagai bagian key
+            self.maybe_reload()
+        start = time.perf_counter()
+        frame_hash, thumbnail = perceptual_hash(analysis.gray)
+        context = (self.generation, recognize, check_quality and self.quality_gate, roster)
+        cached = self.result_cache.get(frame_hash, thumbnail, context)
+        analysis.add_timing('cache', time.perf_counter() - start)
+        if cached is not None:
+            return dict(cached, cache='hit', timings=analysis.timings)
+        
+        result = self._analyze_frame(analysis, recognize, check_quality, roster)
+        # Exception (error 'Error in ...') tidak di-cache, bisa saja sementara
+        if not (result['error'] or '').startswith('Error'):
+            self.result_cache.put(frame_hash, thumbnail, context, result)
+        return dict(result, cache='miss', timings=analysis.timings)
+    
+    def _analyze_frame(self, analysis, recognize, check_quality, roster=None):
+        """Isi analyze_image untuk FrameAnalysis yang sudah di-decode"""
+        quality = None
+        try:
+            if check_quality and self.quality_gate and analysis.gray is not None:
+                quality = analysis.quality()
+                if not quality['ok']:
+                    return {
+                        'face_detected': False,
+                        'face_count': 0,
+                        'recognition': None,
+                        'error': QUALITY_MESSAGES[quality['reason']],
+                        'quality': quality
+                    }
+            face_count = analysis.face_count
+        except Exception as e:
+            return {
+                'face_detected': False,
+                'face_count': 0,
+                'recognition': None,
+                'error': f"Error in face recognition: {str(e)}",
+                'quality': quality
+            }
+        
+        recognition, error = None, None
+        if recognize:
+            recognition, error = self.recognize_analysis(analysis, roster)
+        elif analysis.gray is None:
+            error = "Invalid image data"
+        
+        return {
+            'face_detected': face_count > 0,
+            'face_count': face_count,
+            'recognition': recognition,
+            'error': error,
+            'quality': quality
+        }
+    
+    def ensure_model(self):
+        """Load model kalau belum, atau cek generation baru dari proses lain"""
+        # Load faces if not loaded yet
+        if not self.model_loaded:
+            self.load_known_faces()
+        else:
+            # Ambil model baru dari proses lain tanpa memblokir request
+            self.maybe_reload()
+    
+    def recognize_analysis(self, analysis, roster=None):
+        """Recognize wajah dari FrameAnalysis yang sudah di-decode"""
+        self.ensure_model()
             
-            # Detect faces
-            face_locations = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+        try:
+            if analysis.gray is None:
+                return None, "Invalid image data"
             
-            if len(face_locations) == 0:
+            if analysis.face_count == 0:
                 return None, "No face detected in the image"
             
             # Process each detected face
-            for (x, y, w, h) in face_locations:
-                face_roi = gray[y:y+h, x:x+w]
-                face_roi = cv2.resize(face_roi, (100, 100))
-                
-                # Predict the face
-                label, confidence = self.recognizer.predict(face_roi)
-                
-                # Lower confidence means better match (LBPH returns distance)
-                if confidence < 100:  # Threshold for recognition
-                    # Find the corresponding name
-                    if label in self.known_face_ids:
-                        idx = self.known_face_ids.index(label)
-                        nama = self.known_face_names[idx]
-                        
-                        # Convert confidence to percentage (0-100)
-                        confidence_percent = max(0, 100 - confidence)
-                        
-                        return {
-                            'mahasiswa_id': int(label),
-                            'nama': nama,
-                            'confidence': float(confidence_percent),
-                            'face_found': True
-                        }, None
+            for i in range(analysis.face_count):
+                face_roi = analysis.face_roi(i)
+                start = time.perf_counter()
+                result = self.recognize_roi(face_roi, roster)
+                analysis.add_timing('recognize', time.perf_counter() - start)
+                if result:
+                    return result, None
             
             return None, "Face not recognized"
             
         except Exception as e:
             return None, f"Error in face recognition: {str(e)}"
     
+    @staticmethod
+    def roster_key(roster):
+        """Normalisasi roster (iterable id mahasiswa) jadi tuple terurut, None = semua"""
+        if roster is None:
+            return None
+        return tuple(sorted({int(mahasiswa_id) for mahasiswa_id in roster}))
+    
+    def roster_index(self, snapshot, roster):
+        """Index yang dicari untuk roster, return (index, rows untuk search_many).
+        
+        Baris roster di-copy sekali ke index kecil yang di-cache per snapshot
+        model, jadi query berikutnya tidak meng-copy ulang baris roster.
+        Roster yang lebih besar dari batas cache dicari di index penuh
+        dengan baris di luar roster disaring dari prefilter.
+        """
+        key = (snapshot.generation, len(snapshot.index), roster)
+        index = self._roster_indexes.get(key)
+        if index is not None:
+            return index, None
+        
+        rows = snapshot.index.rows_for(roster)
+        size = len(rows) * snapshot.index.dim * 4
+        if size > self.roster_cache_bytes:
+            return snapshot.index, rows
+        
+        if self._roster_cache_size + size > self.roster_cache_bytes or len(self._roster_indexes) >= 64:
+            self._roster_indexes = {}
+            self._roster_cache_size = 0
+        index = snapshot.index.subset(rows)
+        self._roster_indexes[key] = index
+        self._roster_cache_size += size
+        return index, None
+    
+    def recognize_roi(self, face_roi, roster=None):
+        """Kenali satu ROI wajah 100x100, return dict hasil atau None.
+        
+        roster membatasi kandidat ke id mahasiswa tertentu (misalnya satu
+        kelas). Dengan micro-batching aktif, ROI dari request yang bersamaan
+        dikumpulkan dan dikenali sebagai satu batch.
+        """
+        roster = self.roster_key(roster)
+        if self.batcher is not None:
+            return self.batcher.run((face_roi, roster))
+        return self.recognize_rois([face_roi], roster)[0]
+    
+    def _recognize_batch(self, items):
+        """Proses satu batch (face_roi, roster) dari MicroBatcher, dikelompokkan per roster"""
+        groups = {}
+        for position, (face_roi, roster) in enumerate(items):
+            groups.setdefault(roster, []).append((position, face_roi))
+        
+        results = [None] * len(items)
+        for roster, group in groups.items():
+            group_results = self.recognize_rois([face_roi for _, face_roi in group], roster)
+            for (position, _), result in zip(group, group_results):
+                results[position] = result
+        return results
+    
+    def recognize_rois(self, face_rois, roster=None):
+        """Kenali banyak ROI sekaligus (histogram dan prefilter vectorized)"""
+        # Satu snapshot untuk seluruh batch, training yang publish di tengah jalan tidak terlihat
+        snapshot = self.snapshot
+        names_by_id = snapshot.names_by_id
+        roster = self.roster_key(roster)
+        index, rows = (snapshot.index, None) if roster is None else self.roster_index(snapshot, roster)
+        # Predict the faces lewat identity index (satu GEMM untuk semua ROI)
+        all_matches = index.search_many(self.face_histograms(face_rois), k=1, rows=rows)
+        
+        results = []
+        for matches in all_matches:
+            result = None
+            if matches:
+                label, confidence = matches[0]
+                # Lower confidence means better match (LBPH returns distance)
+                if confidence < 100 and label in names_by_id:  # Threshold for recognition
+                    # Convert confidence to percentage (0-100)
+                    confidence_percent = max(0, 100 - confidence)
+                    result = {
+                        'mahasiswa_id': int(label),
+                        'nama': names_by_id[label],
+                        'confidence': float(confidence_percent),
+                        'face_found': True
+                    }
+            results.append(result)
+        return results
+    
+    def recognize_face(self, image_data):
+        """Recognize wajah dari image data (base64 atau file path)"""
+        try:
+            analysis = self.analyze(image_data)
+        except Exception as e:
+            return None, f"Error in face recognition: {str(e)}"
+        return self.recognize_analysis(analysis)
+    
     def detect_face(self, image_data):
         """Detect apakah ada wajah dalam gambar"""
         try:
-            # Handle base64 image data
-            if isinstance(image_data, str) and image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-                image_bytes = base64.b64decode(image_data)
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            else:
-                image = cv2.imread(image_data)
-            
-            if image is None:
-                return False
-            
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            face_locations = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-            return len(face_locations) > 0
-            
+            return self.analyze(image_data).face_count > 0
         except Exception as e:
             print(f"Error detecting face: {e}")
             return False
@@ -207,24 +898,67 @@ class FaceRecognitionModel:
     def get_face_count(self, image_data):
         """Hitung jumlah wajah dalam gambar"""
         try:
-            if isinstance(image_data, str) and image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-                image_bytes = base64.b64decode(image_data)
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            else:
-                image = cv2.imread(image_data)
-            
-            if image is None:
-                return 0
-            
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            face_locations = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-            return len(face_locations)
-            
+            return self.analyze(image_data).face_count
         except Exception as e:
             print(f"Error counting faces: {e}")
             return 0
 
+
+class FrameAnalysis:
+    """Satu gambar yang di-decode ke grayscale dan dideteksi hanya sekali.
+    
+    Kotak wajah dan ROI 100x100 di-cache, sehingga detect_face, get_face_count
+    dan recognize_face tidak perlu mengulang decode dan detectMultiScale.
+    """
+    
+    def __init__(self, model, image_data):
+        self.model = model
+        # Durasi per tahap (detik) untuk metrics
+        self.timings = {}
+        start = time.perf_counter()
+        # Decode langsung ke grayscale, tanpa gambar BGR dan cvtColor
+        self.gray = model.decode_image(image_data, cv2.IMREAD_GRAYSCALE)
+        self.timings['decode'] = time.perf_counter() - start
+        self._faces = None
+        self._rois = {}
+        self._quality = None
+    
+    def add_timing(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+    
+    def quality(self):
+        """Hasil quality gate untuk frame ini (di-cache)"""
+        if self._quality is None:
+            start = time.perf_counter()
+            self._quality = self.model.check_quality(self.gray)
+            self.add_timing('quality', time.perf_counter() - start)
+        return self._quality
+    
+    @property
+    def faces(self):
+        """Kotak wajah (x, y, w, h), dideteksi saat pertama kali diminta"""
+        if self._faces is None:
+            if self.gray is None:
+                self._faces = []
+            else:
+                start = time.perf_counter()
+                self._faces = [tuple(int(v) for v in box) for box in self.model.detect_faces(self.gray)]
+                self.add_timing('detect', time.perf_counter() - start)
+        return self._faces
+    
+    @property
+    def face_count(self):
+        return len(self.faces)
+    
+    def face_roi(self, index=0):
+        """ROI wajah grayscale yang sudah di-resize ke 100x100"""
+        if index not in self._rois:
+            (x, y, w, h) = self.faces[index]
+            start = time.perf_counter()
+            face_roi = self.gray[y:y+h, x:x+w]
+            self._rois[index] = cv2.resize(face_roi, (100, 100))
+            self.add_timing('resize', time.perf_counter() - start)
+        return self._rois[index]
+
 # Global instance
 face_model = FaceRecognitionModel()
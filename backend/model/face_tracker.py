@@ -0,0 +1,227 @@
+import threading
+import time
+import uuid
+
+
+def box_iou(a, b):
+    """Intersection-over-union dua kotak (x, y, w, h)"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class FaceTrack:
+    """Satu wajah yang diikuti dari frame ke frame dalam satu sesi stream"""
+
+    def __init__(self, track_id, box, frame_index, now):
+        self.id = track_id
+        self.box = box
+        self.first_seen = now
+        self.last_seen = now
+        self.last_frame = frame_index
+        self.frames = 1
+        self.mahasiswa_id = None
+        self.nama = None
+        self.confidence = 0.0
+        self.votes = {}
+        self.attempts = 0
+        self.last_attempt = None
+        self.confirmed = False
+
+    def to_dict(self):
+        return {
+            'track_id': self.id,
+            'box': [int(v) for v in self.box],
+            'frames': self.frames,
+            'mahasiswa_id': self.mahasiswa_id,
+            'nama': self.nama,
+            'confidence': self.confidence,
+            'confirmed': self.confirmed
+        }
+
+
+class FaceTracker:
+    """Tracking wajah antar frame dengan asosiasi IoU.
+
+    Deteksi tetap jalan tiap frame, tetapi recognition hanya untuk track
+    baru atau yang identitasnya belum pasti. Track dianggap pasti kalau
+    confidence >= confirm_confidence, atau identitas yang sama muncul
+    confirm_votes kali. Track yang tidak kunjung dikenali berhenti dicoba
+    setelah max_attempts, supaya orang yang tidak terdaftar tidak memicu
+    recognition di setiap frame.
+    """
+
+    def __init__(self, iou_threshold=0.3, track_timeout=1.0, retry_interval=3,
+                 max_attempts=10, confirm_confidence=30.0, confirm_votes=2):
+        self.iou_threshold = iou_threshold
+        self.track_timeout = track_timeout
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+        self.confirm_confidence = confirm_confidence
+        self.confirm_votes = confirm_votes
+        self.tracks = {}
+        self.frame_index = 0
+        self._next_id = 1
+
+    def _associate(self, boxes):
+        """Pasangkan kotak deteksi ke track aktif secara greedy (IoU terbesar dulu)"""
+        pairs = []
+        for track in self.tracks.values():
+            for i, box in enumerate(boxes):
+                iou = box_iou(track.box, box)
+                if iou >= self.iou_threshold:
+                    pairs.append((iou, track.id, i))
+        pairs.sort(reverse=True)
+
+        matched = {}
+        used_tracks = set()
+        for iou, track_id, i in pairs:
+            if track_id in used_tracks or i in matched:
+                continue
+            used_tracks.add(track_id)
+            matched[i] = self.tracks[track_id]
+        return matched
+
+    def _needs_recognition(self, track):
+        if track.confirmed or track.attempts >= self.max_attempts:
+            return False
+        return track.last_attempt is None or self.frame_index - track.last_attempt >= self.retry_interval
+
+    def _update_identity(self, track, result):
+        """Catat satu hasil recognition, return True kalau track baru saja dikonfirmasi"""
+        track.attempts += 1
+        track.last_attempt = self.frame_index
+        if not result:
+            return False
+
+        mahasiswa_id = result['mahasiswa_id']
+        track.votes[mahasiswa_id] = track.votes.get(mahasiswa_id, 0) + 1
+        # Identitas track = yang paling sering muncul, confidence tertinggi yang tercatat
+        best = max(track.votes, key=track.votes.get)
+        if best == mahasiswa_id:
+            if track.mahasiswa_id != mahasiswa_id:
+                track.confidence = 0.0
+            track.mahasiswa_id = mahasiswa_id
+            track.nama = result['nama']
+            track.confidence = max(track.confidence, result['confidence'])
+
+        if (track.confidence >= self.confirm_confidence
+                or track.votes[track.mahasiswa_id] >= self.confirm_votes):
+            track.confirmed = True
+            return True
+        return False
+
+    def process(self, analysis, recognize, now=None):
+        """Proses satu FrameAnalysis.
+
+        recognize(face_roi) dipanggil hanya untuk track yang perlu dikenali.
+        Return (tracks aktif, track yang baru dikonfirmasi, jumlah recognition).
+        """
+        now = time.monotonic() if now is None else now
+        self.frame_index += 1
+        boxes = analysis.faces
+        matched = self._associate(boxes)
+
+        active = []
+        for i, box in enumerate(boxes):
+            track = matched.get(i)
+            if track is None:
+                track = FaceTrack(self._next_id, box, self.frame_index, now)
+                self.tracks[track.id] = track
+                self._next_id += 1
+            else:
+                track.box = box
+                track.last_seen = now
+                track.last_frame = self.frame_index
+                track.frames += 1
+            active.append((i, track))
+
+        # Buang track yang sudah tidak terlihat
+        for track_id in [t.id for t in self.tracks.values() if now - t.last_seen > self.track_timeout]:
+            del self.tracks[track_id]
+
+        confirmed = []
+        recognitions = 0
+        for i, track in active:
+            if self._needs_recognition(track):
+                recognitions += 1
+                if self._update_identity(track, recognize(analysis.face_roi(i))):
+                    confirmed.append(track)
+
+        return [track for _, track in active], confirmed, recognitions
+
+
+class StreamSession:
+    """State satu kiosk yang sedang streaming"""
+
+    def __init__(self, session_id, owner, tracker):
+        self.id = session_id
+        self.owner = owner
+        self.tracker = tracker
+        # Id mahasiswa yang boleh dikenali di sesi ini (None = semua)
+        self.roster = None
+        self.created = time.monotonic()
+        self.last_active = self.created
+        # Mahasiswa yang sudah menghasilkan event absensi di sesi ini
+        self.emitted = set()
+        self.stats = {'frames': 0, 'recognitions': 0, 'events': 0}
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        return {
+            'session_id': self.id,
+            'stats': dict(self.stats),
+            'active_tracks': len(self.tracker.tracks),
+            'roster_size': len(self.roster) if self.roster is not None else None
+        }
+
+
+class StreamSessions:
+    """Registry sesi stream di proses ini, sesi idle dibuang setelah ttl detik.
+
+    State tracking hidup di memory proses web, jadi dengan beberapa proses
+    server (gunicorn -w N) frame satu sesi harus diarahkan ke proses yang sama.
+    """
+
+    def __init__(self, ttl=60, max_sessions=50, tracker_factory=FaceTracker):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.tracker_factory = tracker_factory
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _expire(self, now):
+        for session_id in [s.id for s in self._sessions.values() if now - s.last_active > self.ttl]:
+            del self._sessions[session_id]
+
+    def create(self, owner):
+        """Buat sesi baru, None kalau jumlah sesi sudah maksimal"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if len(self._sessions) >= self.max_sessions:
+                return None
+            session = StreamSession(uuid.uuid4().hex, owner, self.tracker_factory())
+            self._sessions[session.id] = session
+            return session
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_active = now
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
@@ -0,0 +1,292 @@
+import cv2
+import numpy as np
+
+
+def lbp_histogram(face_roi, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    """Spatial LBP histogram, identik dengan fitur LBPHFaceRecognizer OpenCV.
+
+    Dihitung secara vectorized dengan NumPy sehingga histogram query bisa
+    dibandingkan langsung dengan histogram hasil training LBPH.
+    """
+    return lbp_histograms(np.asarray(face_roi)[None], radius, neighbors, grid_x, grid_y)[0]
+
+
+def lbp_histograms(face_rois, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    """lbp_histogram untuk banyak ROI sekaligus (array (N, H, W)), return (N, dim)"""
+    src = np.asarray(face_rois, dtype=np.float32)
+    count, rows, cols = src.shape
+    height, width = rows - 2 * radius, cols - 2 * radius
+    center = src[:, radius:radius + height, radius:radius + width]
+    codes = np.zeros((count, height, width), np.int32)
+    eps = np.finfo(np.float32).eps
+
+    def shifted(dy, dx):
+        return src[:, radius + dy:radius + dy + height, radius + dx:radius + dx + width]
+
+    for n in range(neighbors):
+        # Titik sampel melingkar dengan interpolasi bilinear (sama seperti elbp OpenCV)
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / neighbors))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / neighbors))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = np.float32(x - fx), np.float32(y - fy)
+        w1 = np.float32((1 - tx) * (1 - ty))
+        w2 = np.float32(tx * (1 - ty))
+        w3 = np.float32((1 - tx) * ty)
+        w4 = np.float32(tx * ty)
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        codes += ((t > center) | (np.abs(t - center) < eps)).astype(np.int32) << n
+
+    # Histogram per sel grid, dinormalisasi per sel lalu digabung
+    bins = 2 ** neighbors
+    cells_per_roi = grid_y * grid_x
+    cell_h, cell_w = height // grid_y, width // grid_x
+    cells = codes[:, :grid_y * cell_h, :grid_x * cell_w]
+    cells = cells.reshape(count, grid_y, cell_h, grid_x, cell_w).transpose(0, 1, 3, 2, 4)
+    cells = cells.reshape(count * cells_per_roi, cell_h * cell_w)
+    offsets = (np.arange(count * cells_per_roi) * bins)[:, None]
+    hist = np.bincount((cells + offsets).ravel(), minlength=count * cells_per_roi * bins)
+    hist = hist.reshape(count, cells_per_roi * bins)
+    return hist.astype(np.float32) / np.float32(cell_h * cell_w)
+
+
+def chi_square(histograms, query):
+    """Jarak chi-square (HISTCMP_CHISQR_ALT, sama dengan LBPH predict) per baris.
+
+    cv2.compareHist per baris, tanpa temporary seukuran matrix kandidat
+    seperti versi NumPy; cukup cepat karena yang dibandingkan hanya shortlist.
+    """
+    query = np.ascontiguousarray(query, dtype=np.float32)
+    return np.array([
+        cv2.compareHist(np.ascontiguousarray(row, dtype=np.float32), query, cv2.HISTCMP_CHISQR_ALT)
+        for row in histograms
+    ])
+
+
+class IdentityIndex:
+    """Index semua histogram wajah untuk search vectorized.
+
+    Matrix menyimpan akar histogram (Hellinger), sehingga kandidat bisa
+    dipilih dengan satu perkalian matrix-vektor (BLAS), lalu hanya
+    `shortlist` kandidat teratas yang dihitung ulang dengan chi-square
+    persis seperti LBPH (roster <= shortlist selalu di-rerank semuanya).
+    Tidak ada mode exact scan penuh: chi-square ~25 us per baris, jadi
+    rerank seluruh index jauh lebih lambat daripada prefilter GEMM.
+
+    Baris model penuh (base, biasanya memory-mapped dari .npy dan dipakai
+    bersama semua worker lewat page cache) tidak pernah ditulis atau
+    di-copy. Wajah yang ditambahkan sesudahnya masuk ke buffer delta kecil
+    di memory; search menghitung keduanya lalu menggabungkan kandidat.
+    Nomor baris global: base dulu, lalu delta.
+    """
+
+    def __init__(self, shortlist=64):
+        if shortlist < 1:
+            raise ValueError('shortlist harus minimal 1')
+        self.shortlist = shortlist
+        self._base = None
+        self._base_ids = np.zeros(0, np.int64)
+        # Buffer delta: baris yang ditambahkan setelah base
+        self._data = None
+        self._ids = np.zeros(0, np.int64)
+        self._size = 0
+        self._rows = {}
+        # Jumlah baris terpakai di buffer _data, dibagi dengan index hasil extended()
+        self._used = [0]
+
+    @classmethod
+    def from_arrays(cls, matrix, ids, shortlist=64):
+        """Index dari matrix akar-histogram yang sudah ada (misal hasil np.load mmap).
+
+        Matrix dipakai apa adanya sebagai base read-only, tanpa copy.
+        """
+        index = cls(shortlist=shortlist)
+        index._base = matrix
+        index._base_ids = np.asarray(ids, dtype=np.int64)
+        for row, mahasiswa_id in enumerate(index._base_ids.tolist()):
+            index._rows.setdefault(mahasiswa_id, []).append(row)
+        return index
+
+    @property
+    def base_size(self):
+        return 0 if self._base is None else len(self._base)
+
+    def __len__(self):
+        return self.base_size + self._size
+
+    @property
+    def dim(self):
+        """Panjang satu histogram, 0 kalau index kosong"""
+        if self.base_size:
+            return self._base.shape[1]
+        return self._data.shape[1] if self._data is not None else 0
+
+    def __contains__(self, mahasiswa_id):
+        return mahasiswa_id in self._rows
+
+    def _parts(self):
+        """(matrix, ids) untuk base dan delta yang tidak kosong, urut nomor baris"""
+        parts = []
+        if self.base_size:
+            parts.append((self._base, self._base_ids))
+        if self._size:
+            parts.append((self._data[:self._size], self._ids[:self._size]))
+        return parts
+
+    @property
+    def matrix(self):
+        """Semua akar histogram; di-copy hanya kalau base dan delta sama-sama terisi"""
+        parts = self._parts()
+        if not parts:
+            return np.zeros((0, 0), np.float32)
+        if len(parts) == 1:
+            return parts[0][0]
+        return np.vstack([matrix for matrix, _ in parts])
+
+    @property
+    def ids(self):
+        parts = self._parts()
+        if len(parts) == 1:
+            return parts[0][1]
+        return np.concatenate([ids for _, ids in parts]) if parts else np.zeros(0, np.int64)
+
+    def _gather(self, rows):
+        """Copy baris (nomor global) dari base/delta, return (matrix, ids)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        base_size = self.base_size
+        in_base = rows < base_size
+        matrix = np.empty((len(rows), self.dim), np.float32)
+        ids = np.empty(len(rows), np.int64)
+        if in_base.any():
+            matrix[in_base] = self._base[rows[in_base]]
+            ids[in_base] = self._base_ids[rows[in_base]]
+        if not in_base.all():
+            delta_rows = rows[~in_base] - base_size
+            matrix[~in_base] = self._data[delta_rows]
+            ids[~in_base] = self._ids[delta_rows]
+        return matrix, ids
+
+    def _reserve(self, rows, dim):
+        """Kapasitas buffer delta tumbuh 2x supaya append tetap amortized O(1)"""
+        if self._data is None:
+            capacity = max(rows, 16)
+            self._data = np.zeros((capacity, dim), np.float32)
+            self._ids = np.zeros(capacity, np.int64)
+            self._used = [0]
+        elif self._size + rows > len(self._data) or self._used[0] != self._size:
+            # Buffer penuh, atau baris setelah _size sudah dipakai index lain
+            capacity = max(self._size + rows, 2 * len(self._data))
+            data = np.zeros((capacity, dim), np.float32)
+            data[:self._size] = self._data[:self._size]
+            ids = np.zeros(capacity, np.int64)
+            ids[:self._size] = self._ids[:self._size]
+            self._data, self._ids = data, ids
+            self._used = [self._size]
+
+    def add(self, histograms, ids):
+        """Tambah satu atau banyak histogram beserta id mahasiswa (ke buffer delta)"""
+        histograms = np.asarray(histograms, dtype=np.float32)
+        if histograms.ndim == 1:
+            histograms = histograms[None, :]
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        if len(histograms) == 0:
+            return
+
+        self._reserve(len(histograms), histograms.shape[1])
+        start = self._size
+        self._data[start:start + len(histograms)] = np.sqrt(histograms)
+        self._ids[start:start + len(histograms)] = ids
+        row_start = self.base_size + start
+        for offset, mahasiswa_id in enumerate(ids.tolist()):
+            # List baru, bukan append, karena dict _rows bisa berbagi list dengan index lain
+            self._rows[mahasiswa_id] = self._rows.get(mahasiswa_id, []) + [row_start + offset]
+        self._size += len(histograms)
+        self._used[0] = self._size
+
+    def extended(self, histograms, ids):
+        """Index baru = index ini + histogram baru; index ini tidak berubah.
+
+        Base dipakai bersama. Baris baru ditulis di buffer delta yang sama
+        setelah _size, yang tidak pernah dibaca index ini, jadi tidak perlu
+        copy. Kalau buffer penuh atau sudah dipakai index lain, buffer delta
+        baru dialokasikan (base tetap tidak di-copy).
+        """
+        index = IdentityIndex(shortlist=self.shortlist)
+        index._base, index._base_ids = self._base, self._base_ids
+        index._data, index._ids, index._size = self._data, self._ids, self._size
+        index._rows = dict(self._rows)
+        index._used = self._used
+        index.add(histograms, ids)
+        return index
+
+    def clear(self):
+        self._base = None
+        self._base_ids = np.zeros(0, np.int64)
+        self._data = None
+        self._ids = np.zeros(0, np.int64)
+        self._size = 0
+        self._rows = {}
+        self._used = [0]
+
+    def search(self, query, k=1):
+        """Cari k identitas terdekat, return list (mahasiswa_id, distance) terurut"""
+        return self.search_many(np.asarray(query, dtype=np.float32).reshape(1, -1), k)[0]
+
+    def rows_for(self, mahasiswa_ids):
+        """Index baris milik mahasiswa_ids, untuk search yang dibatasi roster"""
+        rows = [row for mahasiswa_id in mahasiswa_ids for row in self._rows.get(mahasiswa_id, ())]
+        return np.array(sorted(rows), dtype=np.int64)
+
+    def subset(self, rows):
+        """Index baru berisi baris tertentu saja (copy contiguous), untuk roster yang di-cache"""
+        if len(rows) == 0:
+            return IdentityIndex(shortlist=self.shortlist)
+        matrix, ids = self._gather(rows)
+        return IdentityIndex.from_arrays(matrix, ids, shortlist=self.shortlist)
+
+    def search_many(self, queries, k=1, rows=None):
+        """search untuk banyak query sekaligus; prefilter jadi satu GEMM per bagian.
+
+        rows membatasi kandidat ke baris tertentu (lihat rows_for): baris di
+        luar roster tidak pernah masuk shortlist.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        size = len(self)
+        if size == 0 or (rows is not None and len(rows) == 0):
+            return [[] for _ in range(len(queries))]
+
+        candidates = np.arange(size) if rows is None else np.asarray(rows, dtype=np.int64)
+        shortlist = None
+        if len(candidates) > self.shortlist:
+            # Prefilter: similarity Hellinger base dan delta, digabung per query
+            roots = np.sqrt(queries)
+            similarity = np.hstack([roots @ matrix.T for matrix, _ in self._parts()])
+            if rows is not None:
+                similarity = similarity[:, candidates]
+            top = np.argpartition(-similarity, self.shortlist - 1, axis=1)[:, :self.shortlist]
+            shortlist = candidates[top]
+
+        return [
+            self._rerank(shortlist[i] if shortlist is not None else candidates, query, k)
+            for i, query in enumerate(queries)
+        ]
+
+    def _rerank(self, rows, query, k):
+        """Rerank kandidat dengan chi-square persis seperti LBPH"""
+        candidates, ids = self._gather(rows)
+        # Matrix menyimpan akar histogram, kuadratkan kandidat in-place
+        np.square(candidates, out=candidates)
+        distances = chi_square(candidates, query)
+        order = np.argsort(distances, kind='stable')
+
+        results = []
+        seen = set()
+        for i in order:
+            mahasiswa_id = int(ids[i])
+            if mahasiswa_id in seen:
+                continue
+            seen.add(mahasiswa_id)
+            results.append((mahasiswa_id, float(distances[i])))
+            if len(results) >= k:
+                break
+        return results
@@ -0,0 +1,88 @@
+import sys
+import threading
+import time
+
+
+class LazyFaceModel:
+    """Proxy face_model yang baru mengimport OpenCV/NumPy saat pertama dipakai.
+
+    Routes cukup mengimport proxy ini, jadi proses yang tidak pernah
+    menyentuh face recognition (worker khusus auth, script) tidak membayar
+    import cv2 dan pembuatan detector. warm_up() memuat model di background
+    thread saat server start, supaya request pertama tidak menunggu load model.
+    """
+
+    def __init__(self):
+        object.__setattr__(self, '_model', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+        object.__setattr__(self, '_warmup_thread', None)
+        object.__setattr__(self, '_warmup', {'state': 'cold', 'seconds': None, 'error': None})
+
+    def get(self):
+        """FaceRecognitionModel global, diimport dan dibuat saat pertama diminta"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from model.face_recognition_model import face_model
+                    object.__setattr__(self, '_model', face_model)
+        return self._model
+
+    @property
+    def initialized(self):
+        """True kalau modul model sudah diimport (lewat proxy ini atau langsung)"""
+        if self._model is None and 'model.face_recognition_model' in sys.modules:
+            self.get()
+        return self._model is not None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get(), name, value)
+
+    def warm_up(self, app):
+        """Mulai load model + inisialisasi OpenCV di background thread"""
+        if self._warmup_thread is not None:
+            return
+        thread = threading.Thread(target=self._run_warmup, args=(app,), name='face-warmup', daemon=True)
+        object.__setattr__(self, '_warmup_thread', thread)
+        self._warmup['state'] = 'warming'
+        thread.start()
+
+    def _run_warmup(self, app):
+        start = time.monotonic()
+        try:
+            import numpy as np
+
+            model = self.get()
+            with app.app_context():
+                # Model dari disk, atau rebuild dari database kalau belum ada
+                model.load_known_faces()
+            # Inisialisasi detector dan page-in index (mmap) dengan frame kosong
+            model.detect_faces(np.zeros((240, 320), np.uint8))
+            if len(model.index):
+                model.recognize_rois([np.zeros((100, 100), np.uint8)])
+            self._warmup['state'] = 'ready'
+            print(f"Face model warm-up selesai: {len(model.index)} wajah, "
+                  f"{time.monotonic() - start:.1f}s")
+        except Exception as e:
+            self._warmup['state'] = 'failed'
+            self._warmup['error'] = str(e)
+            print(f"Error warming up face model: {e}")
+        finally:
+            self._warmup['seconds'] = time.monotonic() - start
+
+    @property
+    def ready(self):
+        """True kalau model sudah dimuat (lewat warm-up atau request pertama)"""
+        if self._warmup['state'] == 'ready':
+            return True
+        return self.initialized and self._model.model_loaded
+
+    def readiness(self):
+        """Status warm-up untuk /health"""
+        return dict(self._warmup, ready=self.ready, initialized=self.initialized)
+
+
+# Global instance
+face_model = LazyFaceModel()
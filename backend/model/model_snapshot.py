@@ -0,0 +1,41 @@
+import copy
+
+
+class ModelSnapshot:
+    """Satu versi model recognition yang tidak diubah lagi setelah dipublish.
+
+    Recognition membaca face_model.snapshot sekali dan memakai objek yang
+    sama sampai selesai. Training, delta dari proses lain dan rebuild
+    membuat snapshot baru (with_faces / snapshot baru dari train_faces),
+    lalu menggantinya dengan satu assignment, jadi request yang sedang
+    berjalan tidak pernah melihat model setengah jadi dan tidak perlu lock.
+    """
+
+    def __init__(self, index, ids=(), names=(), generation=0):
+        self.index = index
+        self.known_face_ids = list(ids)
+        self.known_face_names = list(names)
+        self.names_by_id = dict(zip(self.known_face_ids, self.known_face_names))
+        self.generation = generation
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, mahasiswa_id):
+        return mahasiswa_id in self.names_by_id
+
+    def with_faces(self, histograms, ids, names):
+        """Snapshot baru = snapshot ini + wajah baru"""
+        ids, names = list(ids), list(names)
+        snapshot = copy.copy(self)
+        snapshot.index = self.index.extended(histograms, ids)
+        snapshot.known_face_ids = self.known_face_ids + ids
+        snapshot.known_face_names = self.known_face_names + names
+        snapshot.names_by_id = dict(self.names_by_id)
+        snapshot.names_by_id.update(zip(ids, names))
+        return snapshot
+
+    def with_generation(self, generation):
+        snapshot = copy.copy(self)
+        snapshot.generation = generation
+        return snapshot
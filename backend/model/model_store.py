@@ -0,0 +1,227 @@
+import json
+import os
+import pickle
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from model.identity_index import IdentityIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Folder default untuk artefak model, relatif ke folder backend (bukan CWD)
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model_data')
+
+
+class ModelStore:
+    """Artefak model berversi dengan manifest yang ditulis secara atomik.
+
+    Setiap simpan model penuh menulis file baru `face_model.<gen>.yml` dan
+    `face_labels.<gen>.pkl`, lalu mengganti `manifest.json` dengan os.replace.
+    Enrollment incremental hanya meng-append ke delta log milik model penuh
+    tersebut dan menaikkan generation di manifest. Proses lain cukup stat
+    manifest untuk tahu ada model baru.
+    """
+
+    def __init__(self, directory=DEFAULT_MODEL_DIR):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.lock_path = os.path.join(directory, '.lock')
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def model_path(self, base_generation):
+        return self.path(f'face_model.{base_generation}.yml')
+
+    def labels_path(self, base_generation):
+        return self.path(f'face_labels.{base_generation}.pkl')
+
+    def index_path(self, base_generation):
+        return self.path(f'face_index.{base_generation}.npy')
+
+    def index_ids_path(self, base_generation):
+        return self.path(f'face_index_ids.{base_generation}.npy')
+
+    def delta_path(self, base_generation):
+        return self.path(f'face_model_delta.{base_generation}.pkl')
+
+    @contextmanager
+    def lock(self):
+        """Lock antar thread dan antar proses untuk menulis artefak (reentrant)"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._thread_lock:
+            if self._depth:
+                # Thread ini sudah memegang file lock
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+
+            with open(self.lock_path, 'a+b') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                self._depth = 1
+                try:
+                    yield
+                finally:
+                    self._depth = 0
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+                    else:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def manifest_stamp(self):
+        """Signature murah dari manifest (satu stat), None kalau belum ada"""
+        try:
+            stat = os.stat(self.manifest_path)
+            return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            return None
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_atomic(self, path, write):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def write_manifest(self, manifest):
+        self._write_atomic(
+            self.manifest_path,
+            lambda f: f.write(json.dumps(manifest).encode('utf-8'))
+        )
+
+    def write_base(self, recognizer, index, names, ids, model_format='npy'):
+        """Simpan model penuh sebagai generation baru (caller memegang lock).
+
+        model_format 'npy': matrix histogram + label sebagai .npy biner yang
+        bisa di-memory-map. 'yml': format YAML LBPHFaceRecognizer (lama).
+        """
+        current = self.read_manifest() or {'generation': 0}
+        generation = current['generation'] + 1
+
+        if model_format == 'yml':
+            # recognizer.save butuh path, jadi tulis ke tmp lalu rename
+            model_path = self.model_path(generation)
+            tmp_model = f'{model_path}.{os.getpid()}.tmp.yml'
+            recognizer.save(tmp_model)
+            os.replace(tmp_model, model_path)
+        else:
+            matrix = np.ascontiguousarray(index.matrix)
+            self._write_atomic(self.index_path(generation), lambda f: np.save(f, matrix))
+            self._write_atomic(self.index_ids_path(generation), lambda f: np.save(f, index.ids))
+        self._write_atomic(
+            self.labels_path(generation),
+            lambda f: pickle.dump({'names': names, 'ids': ids}, f)
+        )
+
+        manifest = {
+            'generation': generation,
+            'base_generation': generation,
+            'format': model_format,
+            'delta_count': 0
+        }
+        self.write_manifest(manifest)
+        self.cleanup(current.get('base_generation', generation))
+        return manifest
+
+    def append_delta(self, record):
+        """Append satu record ke delta log lalu naikkan generation (caller memegang lock)"""
+        manifest = self.read_manifest()
+        delta_path = self.delta_path(manifest['base_generation'])
+        with open(delta_path, 'ab') as f:
+            # Buang sisa record yang tidak pernah tercatat di manifest
+            f.truncate(self.delta_size(manifest))
+            pickle.dump(record, f)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+
+        manifest = dict(
+            manifest,
+            generation=manifest['generation'] + 1,
+            delta_count=manifest['delta_count'] + 1,
+            delta_size=size
+        )
+        self.write_manifest(manifest)
+        return manifest
+
+    def delta_size(self, manifest):
+        """Ukuran byte delta log yang tercatat di manifest"""
+        return manifest.get('delta_size', 0) if manifest['delta_count'] else 0
+
+    def read_base(self, manifest, recognizer, shortlist=64):
+        """Load model penuh, return (names, ids, index).
+
+        Untuk format 'yml' histogram di-load ke recognizer dan index bernilai
+        None; untuk 'npy' index langsung di-memory-map (read-only, dipakai
+        bersama lewat page cache oleh semua worker).
+        """
+        base_generation = manifest['base_generation']
+        index = None
+        if manifest.get('format', 'yml') == 'yml':
+            recognizer.read(self.model_path(base_generation))
+        else:
+            index = IdentityIndex.from_arrays(
+                np.load(self.index_path(base_generation), mmap_mode='r'),
+                np.load(self.index_ids_path(base_generation)),
+                shortlist=shortlist
+            )
+        with open(self.labels_path(base_generation), 'rb') as f:
+            data = pickle.load(f)
+        return list(data['names']), list(data['ids']), index
+
+    def read_delta(self, manifest, start=0, offset=0):
+        """Record delta yang tercatat di manifest, mulai dari index start.
+
+        offset adalah posisi byte record ke-start (delta_size dari manifest
+        yang sudah diterapkan), jadi catch-up cukup membaca record baru saja.
+        """
+        count = manifest['delta_count']
+        if count <= start:
+            return []
+
+        records = []
+        with open(self.delta_path(manifest['base_generation']), 'rb') as f:
+            f.seek(offset)
+            while len(records) < count - start:
+                records.append(pickle.load(f))
+        return records
+
+    def cleanup(self, keep_from):
+        """Hapus artefak lama; model penuh sebelumnya tetap disimpan untuk reader yang sedang load"""
+        for name in os.listdir(self.directory):
+            parts = name.split('.')
+            if len(parts) < 3 or not parts[0].startswith('face_') or not parts[1].isdigit():
+                continue
+            if int(parts[1]) < keep_from:
+                try:
+                    os.remove(self.path(name))
+                except OSError:
+                    pass
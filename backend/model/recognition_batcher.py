@@ -0,0 +1,77 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Gabungkan permintaan dari banyak thread menjadi satu batch.
+
+    Item pertama yang masuk membuka window `window` detik; semua item yang
+    datang selama window itu (maksimal max_batch) diproses bersama dengan
+    satu panggilan process(items) -> list hasil, lalu hasilnya dibagikan
+    kembali ke thread masing-masing.
+    """
+
+    def __init__(self, process, window=0.01, max_batch=32):
+        self.process = process
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counters = {'batches': 0, 'items': 0, 'max_batch_size': 0}
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._dispatch, name='recognition-batcher', daemon=True)
+                    self._thread.start()
+
+    def submit(self, item):
+        """Masukkan satu item, return Future hasilnya"""
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def run(self, item):
+        """Proses satu item lewat batch dan tunggu hasilnya"""
+        return self.submit(item).result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._collect()
+            self.counters['batches'] += 1
+            self.counters['items'] += len(batch)
+            self.counters['max_batch_size'] = max(self.counters['max_batch_size'], len(batch))
+            try:
+                results = self.process([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+    def stats(self):
+        batches = self.counters['batches']
+        return dict(
+            self.counters,
+            window_ms=self.window * 1000,
+            max_batch=self.max_batch,
+            avg_batch_size=self.counters['items'] / batches if batches else 0.0
+        )
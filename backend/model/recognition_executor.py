@@ -0,0 +1,156 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import observe_stages
+from model.lazy_model import face_model
+
+# Model milik masing-masing worker process
+_worker_model = None
+
+
+def _init_worker():
+    """Initializer worker: load salinan model sendiri dari artefak model"""
+    global _worker_model
+    import cv2
+    # Import modul sudah membuat face_model global, pakai itu (bukan model kedua)
+    from model.face_recognition_model import face_model as model
+
+    # Satu worker = satu core, hindari oversubscription thread OpenCV
+    cv2.setNumThreads(1)
+    _worker_model = model
+    # Worker memproses satu frame per waktu, micro-batching hanya menambah latency
+    _worker_model.batcher = None
+    _worker_model.model_loaded = _worker_model.load_model()
+
+
+def _ensure_worker_model():
+    """Pastikan worker punya model; update berikutnya diambil lewat generation"""
+    if not _worker_model.model_loaded:
+        _worker_model.model_loaded = _worker_model.load_model()
+    return _worker_model.model_loaded
+
+
+def _analyze_in_worker(image_data, recognize, check_quality, roster):
+    """Dijalankan di worker process"""
+    if recognize and not _ensure_worker_model():
+        # Belum ada file model; biarkan proses utama rebuild dari database
+        return None
+    return _worker_model.analyze_image(
+        image_data, recognize=recognize, check_quality=check_quality, roster=roster
+    )
+
+
+class RecognitionBusy(Exception):
+    """Worker pool tidak selesai dalam RECOGNITION_TIMEOUT; client sebaiknya retry"""
+
+
+class RecognitionExecutor:
+    """Pool worker process opsional untuk decode, deteksi dan predict wajah.
+
+    Dengan workers=0 semua analisis berjalan inline di thread request
+    menggunakan face_model global, sama seperti sebelumnya.
+    """
+
+    def __init__(self, workers=0, timeout=10):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = None
+
+    def init_app(self, app):
+        self.workers = app.config.get('RECOGNITION_WORKERS', self.workers)
+        self.timeout = app.config.get('RECOGNITION_TIMEOUT', self.timeout)
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn lebih aman daripada fork untuk OpenCV dan server multi-thread
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+        return self._pool
+
+    def submit(self, image_data, recognize=True, check_quality=True, roster=None):
+        """Kirim satu frame ke pool, return future"""
+        return self._get_pool().submit(_analyze_in_worker, image_data, recognize, check_quality, roster)
+
+    def _result(self, future, image_data, recognize, check_quality, roster):
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Pool sedang penuh; menjalankan ulang frame inline hanya menambah
+            # beban CPU selagi worker masih memprosesnya, jadi tolak saja
+            future.cancel()
+            print(f"Recognition worker timeout setelah {self.timeout}s")
+            raise RecognitionBusy('Recognition timeout')
+        except BrokenProcessPool as e:
+            # Worker mati (misal OOM), buat pool baru untuk request berikutnya
+            print(f"Recognition pool broken, fallback inline: {e}")
+            self._reset_pool()
+            result = None
+        except Exception as e:
+            print(f"Recognition worker error, fallback inline: {e}")
+            result = None
+
+        if result is None:
+            return face_model.analyze_image(
+                image_data, recognize=recognize, check_quality=check_quality, roster=roster
+            )
+        # Cache hasil ada di tiap worker; hit/miss dicatat di proses utama supaya terlihat
+        face_model.result_cache.count(result.get('cache'))
+        return result
+
+    def analyze_image(self, image_data, recognize=True, check_quality=True, roster=None):
+        """Sama dengan face_model.analyze_image, tapi dijalankan di pool bila aktif"""
+        if not self.enabled:
+            result = face_model.analyze_image(
+                image_data, recognize=recognize, check_quality=check_quality, roster=roster
+            )
+        else:
+            future = self.submit(image_data, recognize, check_quality, roster)
+            result = self._result(future, image_data, recognize, check_quality, roster)
+        # Durasi tahap dari worker maupun inline dicatat di proses utama
+        observe_stages(result.get('timings'))
+        return result
+
+    def analyze_many(self, images, recognize=True, check_quality=True, roster=None):
+        """Analisis banyak frame sekaligus, tersebar ke semua worker"""
+        if not self.enabled:
+            results = [
+                face_model.analyze_image(
+                    image_data, recognize=recognize, check_quality=check_quality, roster=roster
+                )
+                for image_data in images
+            ]
+        else:
+            futures = [self.submit(image_data, recognize, check_quality, roster) for image_data in images]
+            try:
+                results = [
+                    self._result(future, image_data, recognize, check_quality, roster)
+                    for future, image_data in zip(futures, images)
+                ]
+            except RecognitionBusy:
+                # Frame lain yang belum mulai tidak perlu diproses lagi
+                for future in futures:
+                    future.cancel()
+                raise
+        for result in results:
+            observe_stages(result.get('timings'))
+        return results
+
+    def _reset_pool(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self._reset_pool()
+
+
+# Global instance
+recognition_executor = RecognitionExecutor()
@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+import uuid
+
+
+class RecognitionJob:
+    """Satu job check-in async beserta hasilnya"""
+
+    def __init__(self, owner):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.status = 'queued'
+        self.result = None
+        self.status_code = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+        if self.done:
+            data['status_code'] = self.status_code
+            data['result'] = self.result
+        return data
+
+
+class RecognitionJobQueue:
+    """Antrian job recognition terbatas dengan thread worker khusus.
+
+    Request check-in cukup memasukkan job lalu langsung return job id, jadi
+    worker WSGI tidak tertahan selama pipeline CV berjalan. Job dijalankan
+    di dalam app context supaya bisa memakai database. Dengan workers=0
+    mode async nonaktif.
+    """
+
+    def __init__(self, workers=0, max_size=100, ttl=300):
+        self.workers = workers
+        self.max_size = max_size
+        self.ttl = ttl
+        self._app = None
+        self._queue = None
+        self._threads = []
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.counters = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+
+    def init_app(self, app):
+        self._app = app
+        self.workers = app.config.get('RECOGNITION_QUEUE_WORKERS', self.workers)
+        self.max_size = app.config.get('RECOGNITION_QUEUE_SIZE', self.max_size)
+        self.ttl = app.config.get('RECOGNITION_JOB_TTL', self.ttl)
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _start(self):
+        """Buat antrian dan thread worker saat job pertama masuk"""
+        if self._queue is not None:
+            return
+        self._queue = queue.Queue(maxsize=self.max_size)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'recognition-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _expire(self, now):
+        for job_id in [j.id for j in self._jobs.values() if j.done and now - j.finished > self.ttl]:
+            del self._jobs[job_id]
+
+    def submit(self, owner, func, *args):
+        """Masukkan job func(*args) -> (body, status_code), None kalau antrian penuh"""
+        with self._lock:
+            self._start()
+            self._expire(time.time())
+            job = RecognitionJob(owner)
+            try:
+                self._queue.put_nowait((job, func, args))
+            except queue.Full:
+                self.counters['rejected'] += 1
+                return None
+            self._jobs[job.id] = job
+            self.counters['submitted'] += 1
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job, timeout):
+        """Tunggu sampai status job berubah atau timeout, return status terbaru"""
+        with self._changed:
+            status = job.status
+            if not job.done:
+                self._changed.wait_for(lambda: job.status != status, timeout=timeout)
+            return job.status
+
+    def _set_status(self, job, status, result=None, status_code=None):
+        with self._changed:
+            job.status = status
+            if status == 'running':
+                job.started = time.time()
+            else:
+                job.result = result
+                job.status_code = status_code
+                job.finished = time.time()
+                self.counters['completed' if status == 'done' else 'failed'] += 1
+            self._changed.notify_all()
+
+    def _worker(self):
+        while True:
+            job, func, args = self._queue.get()
+            self._set_status(job, 'running')
+            try:
+                with self._app.app_context():
+                    body, status_code = func(*args)
+                self._set_status(job, 'done', body, status_code)
+            except Exception as e:
+                print(f"Recognition job {job.id} error: {e}")
+                self._set_status(job, 'failed', {
+                    'success': False,
+                    'message': f'Error: {str(e)}'
+                }, 500)
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == 'running')
+            return dict(
+                self.counters,
+                enabled=self.enabled,
+                workers=self.workers,
+                queue_depth=self._queue.qsize() if self._queue is not None else 0,
+                capacity=self.max_size,
+                running=running
+            )
+
+
+# Global instance
+recognition_jobs = RecognitionJobQueue()
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def perceptual_hash(gray):
+    """pHash 64-bit dari gambar grayscale, return (hash, thumbnail 32x32).
+
+    DCT dari versi 32x32, ambil blok frekuensi rendah 8x8 lalu bandingkan
+    dengan median. Frame yang hampir sama menghasilkan hash dengan jarak
+    Hamming kecil.
+    """
+    thumbnail = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(np.float32(thumbnail))[:8, :8].ravel()
+    bits = dct > np.median(dct[1:])
+    bits[0] = False  # komponen DC (brightness rata-rata) tidak dipakai
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big'), thumbnail
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class ResultCache:
+    """Cache LRU + TTL untuk hasil analisis frame yang hampir identik.
+
+    Key-nya pHash frame plus context (generation model dan opsi analisis),
+    jadi hasil lama otomatis tidak dipakai lagi setelah model berubah.
+    Karena pHash seluruh frame didominasi background kiosk, kandidat juga
+    harus lolos cek thumbnail 32x32 (selisih piksel maksimum), supaya wajah
+    orang lain di posisi kamera yang sama tidak ikut dianggap duplikat.
+    """
+
+    def __init__(self, max_size=256, ttl=5.0, max_distance=4, max_pixel_diff=12):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_pixel_diff = max_pixel_diff
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _matches(self, entry, frame_hash, thumbnail):
+        if hamming(entry[0], frame_hash) > self.max_distance:
+            return False
+        diff = cv2.absdiff(entry[1], thumbnail)
+        return int(diff.max()) <= self.max_pixel_diff
+
+    def get(self, frame_hash, thumbnail, context):
+        """Hasil untuk frame yang hampir sama dalam context yang sama, atau None"""
+        now = time.monotonic()
+        with self._lock:
+            # Buang entry kedaluwarsa (urutan OrderedDict = urutan dipakai)
+            for key in [k for k, e in self._entries.items() if e[3] <= now]:
+                del self._entries[key]
+
+            key = (frame_hash, context)
+            entry = self._entries.get(key)
+            if entry is None or not self._matches(entry, frame_hash, thumbnail):
+                entry = None
+                for other_key, other in reversed(self._entries.items()):
+                    if other_key[1] == context and self._matches(other, frame_hash, thumbnail):
+                        key, entry = other_key, other
+                        break
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, frame_hash, thumbnail, context, result):
+        with self._lock:
+            key = (frame_hash, context)
+            self._entries[key] = (frame_hash, thumbnail, result, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def count(self, status):
+        """Catat hit/miss yang terjadi di proses lain (worker recognition)"""
+        with self._lock:
+            if status == 'hit':
+                self.hits += 1
+            elif status == 'miss':
+                self.misses += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl
+        }
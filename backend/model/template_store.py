@@ -0,0 +1,92 @@
+import hashlib
+import os
+import uuid
+
+import numpy as np
+
+
+class TemplateStore:
+    """Cache crop wajah 100x100 ternormalisasi per mahasiswa dalam satu file .npz.
+
+    Setiap template disimpan bersama checksum foto asalnya, jadi rebuild model
+    cukup mendeteksi ulang foto yang baru atau berubah.
+    """
+
+    def __init__(self, path='face_templates.npz'):
+        self.path = path
+        self._templates = {}
+        self._dirty = False
+
+    @staticmethod
+    def file_checksum(path, chunk_size=1 << 20):
+        """SHA-1 isi file foto"""
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def __len__(self):
+        return len(self._templates)
+
+    def load(self):
+        """Baca semua template dari disk, return jumlah template"""
+        self._templates = {}
+        self._dirty = False
+        if not os.path.exists(self.path):
+            return 0
+
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                ids = data['ids']
+                checksums = data['checksums']
+                faces = data['faces']
+            for mahasiswa_id, checksum, face in zip(ids.tolist(), checksums.tolist(), faces):
+                self._templates[mahasiswa_id] = (checksum, face)
+        except Exception as e:
+            print(f"Error loading face templates: {e}")
+            self._templates = {}
+        return len(self._templates)
+
+    def get(self, mahasiswa_id, checksum):
+        """Template untuk mahasiswa ini, hanya kalau checksum fotonya masih sama"""
+        entry = self._templates.get(mahasiswa_id)
+        if entry is not None and entry[0] == checksum:
+            return entry[1]
+        return None
+
+    def put(self, mahasiswa_id, checksum, face):
+        self._templates[mahasiswa_id] = (checksum, np.asarray(face, dtype=np.uint8))
+        self._dirty = True
+
+    def retain(self, mahasiswa_ids):
+        """Buang template mahasiswa yang sudah tidak ada"""
+        keep = set(mahasiswa_ids)
+        for mahasiswa_id in list(self._templates):
+            if mahasiswa_id not in keep:
+                del self._templates[mahasiswa_id]
+                self._dirty = True
+
+    def save(self):
+        """Tulis semua template ke disk secara atomik (kalau ada perubahan)"""
+        if not self._dirty:
+            return
+
+        ids = sorted(self._templates)
+        # Nama sementara unik: beberapa proses backend bisa rebuild bersamaan
+        tmp_path = f'{self.path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    ids=np.array(ids, dtype=np.int64),
+                    checksums=np.array([self._templates[i][0] for i in ids], dtype='U40'),
+                    faces=np.array([self._templates[i][1] for i in ids], dtype=np.uint8).reshape(-1, 100, 100)
+                )
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            print(f"Error saving face templates: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -1,91 +1,674 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from database import db, Absensi, Mahasiswa
-from model.face_recognition_model import face_model
+from model.recognition_executor import recognition_executor, RecognitionBusy
+from model.lazy_model import face_model
+from model.face_tracker import StreamSessions
+from model.recognition_jobs import recognition_jobs
+from metrics import CHECKIN_OUTCOMES, STAGE_LATENCY, observe_stages
 from datetime import datetime, date, time
+import time as time_module
 import base64
+import json
 import os
 
 absensi_bp = Blueprint('absensi', __name__)
 
+# Batas jumlah frame per request batch
+MAX_BATCH_IMAGES = 20
+# Batas lama (detik) satu koneksi SSE status job boleh menahan worker
+MAX_EVENTS_TIMEOUT = 60
+
+# Sesi streaming kiosk (state tracking per sesi, di memory proses ini)
+stream_sessions = StreamSessions()
+
+def payload_too_large():
+    """Response 413 kalau body request melebihi MAX_CONTENT_LENGTH"""
+    max_size = current_app.config.get('MAX_CONTENT_LENGTH')
+    if max_size and request.content_length and request.content_length > max_size:
+        return jsonify({
+            'success': False,
+            'message': f'Ukuran foto maksimal {max_size // 1024} KB'
+        }), 413
+    return None
+
+def recognition_busy():
+    """Response 503 saat worker recognition tidak sempat memproses frame"""
+    response = jsonify({
+        'success': False,
+        'message': 'Server sedang sibuk memproses absensi, coba lagi sebentar'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def get_request_image():
+    """Ambil foto dari request: body image/* mentah, multipart field 'image', atau JSON base64"""
+    if request.mimetype.startswith('image/'):
+        # Bytes JPEG langsung dari body, tanpa base64 dan parsing JSON
+        return request.get_data(cache=False)
+    if request.mimetype == 'multipart/form-data':
+        foto = request.files.get('image')
+        return foto.read() if foto else None
+    
+    data = request.get_json(silent=True) or {}
+    return data.get('image')
+
+def get_request_images():
+    """Ambil banyak foto: multipart field 'images' atau JSON list base64"""
+    if request.mimetype == 'multipart/form-data':
+        return [foto.read() for foto in request.files.getlist('images')]
+    
+    data = request.get_json(silent=True) or {}
+    return data.get('images')
+
+def get_request_roster(current_user):
+    """Roster kandidat untuk recognition, return (tuple id mahasiswa atau None, error).
+    
+    Sumber (yang pertama ada dipakai): field 'roster' (list id atau "1,2,3"),
+    field 'jurusan', lalu konfigurasi kiosk di KIOSK_ROSTERS berdasarkan header
+    X-Kiosk-Id atau field 'kiosk'. Field dibaca dari query string, form
+    multipart, atau body JSON. None berarti cocokkan dengan semua mahasiswa.
+    
+    Hanya token admin (kiosk) yang boleh membatasi roster. Token mahasiswa
+    selalu dicocokkan dengan semua mahasiswa, supaya mahasiswa tidak bisa
+    membuang pemilik wajah asli dari pencarian dan lolos cek identitas.
+    """
+    if current_user.get('type') != 'admin':
+        return None, None
+    
+    data = request.get_json(silent=True) if request.is_json else None
+    if not isinstance(data, dict):
+        data = {}
+    
+    def field(name):
+        value = request.args.get(name)
+        if value is None and request.mimetype == 'multipart/form-data':
+            value = request.form.get(name)
+        if value is None:
+            value = data.get(name)
+        return value
+    
+    roster, jurusan = field('roster'), field('jurusan')
+    if roster is None and jurusan is None:
+        kiosk_id = request.headers.get('X-Kiosk-Id') or field('kiosk')
+        if kiosk_id:
+            kiosk = current_app.config.get('KIOSK_ROSTERS', {}).get(str(kiosk_id))
+            if kiosk is None:
+                return None, f'Kiosk {kiosk_id} tidak dikonfigurasi'
+            roster, jurusan = kiosk.get('roster'), kiosk.get('jurusan')
+    
+    if roster is not None:
+        if isinstance(roster, str):
+            roster = [item for item in roster.split(',') if item.strip()]
+        try:
+            return tuple(int(mahasiswa_id) for mahasiswa_id in roster), None
+        except (TypeError, ValueError):
+            return None, 'Roster harus berupa daftar ID mahasiswa'
+    
+    if jurusan is not None:
+        rows = Mahasiswa.query.with_entities(Mahasiswa.id).filter_by(jurusan=jurusan).all()
+        return tuple(row.id for row in rows), None
+    
+    return None, None
+
+def analysis_outcome(analysis):
+    """Kategori hasil analisis frame untuk metrics check-in"""
+    quality = analysis.get('quality')
+    if quality and not quality['ok']:
+        return 'low_quality'
+    if analysis['recognition']:
+        return 'recognized'
+    error = analysis['error'] or ''
+    if error.startswith('Error'):
+        return 'error'
+    if error == 'Invalid image data':
+        return 'invalid_image'
+    if analysis['face_count'] == 0:
+        return 'no_face'
+    return 'not_recognized'
+
+def insert_absensi(mahasiswa_ids, today, now):
+    """Catat absensi 'hadir' untuk banyak mahasiswa sekaligus.
+    
+    Return (id yang baru dicatat, set id yang sudah absen hari ini).
+    """
+    with STAGE_LATENCY.time(stage='db'):
+        # Cek yang sudah absen hari ini dengan satu query
+        already_absen = set()
+        if mahasiswa_ids:
+            already_absen = {
+                row.id_mahasiswa for row in Absensi.query.filter(
+                    Absensi.id_mahasiswa.in_(mahasiswa_ids),
+                    Absensi.tanggal == today
+                ).all()
+            }
+        
+        # Insert semua absensi baru dalam satu transaksi
+        new_ids = [mid for mid in mahasiswa_ids if mid not in already_absen]
+        if new_ids:
+            db.session.add_all([
+                Absensi(
+                    id_mahasiswa=mahasiswa_id,
+                    tanggal=today,
+                    jam=now.time(),
+                    status='hadir'
+                )
+                for mahasiswa_id in new_ids
+            ])
+            db.session.commit()
+    return new_ids, already_absen
+
+def check_in(current_user, image_data, endpoint='absensi', roster=None):
+    """Recognize satu foto lalu catat absensi, return (body, status code)"""
+    # Recognize face (decode dan deteksi hanya sekali)
+    analysis = recognition_executor.analyze_image(image_data, roster=roster)
+    recognition_result = analysis['recognition']
+    error = analysis['error']
+    
+    outcome = analysis_outcome(analysis)
+    if outcome != 'recognized':
+        CHECKIN_OUTCOMES.inc(endpoint=endpoint, outcome=outcome)
+    
+    if error:
+        response = {
+            'success': False,
+            'message': error
+        }
+        quality = analysis.get('quality')
+        if quality and not quality['ok']:
+            # Frame ditolak quality gate, client bisa langsung ambil ulang
+            response['reason'] = quality['reason']
+        return response, 400
+    
+    if not recognition_result:
+        return {
+            'success': False,
+            'message': 'Wajah tidak dikenali'
+        }, 400
+    
+    mahasiswa_id = recognition_result['mahasiswa_id']
+    nama = recognition_result['nama']
+    confidence = recognition_result['confidence']
+    
+    # Check if user is mahasiswa and matches the recognized face
+    if current_user.get('type') == 'mahasiswa' and current_user.get('id') != mahasiswa_id:
+        CHECKIN_OUTCOMES.inc(endpoint=endpoint, outcome='mismatch')
+        return {
+            'success': False,
+            'message': 'Wajah tidak sesuai dengan akun yang login'
+        }, 403
+    
+    with STAGE_LATENCY.time(stage='db'):
+        # Check if already absen today
+        today = date.today()
+        existing_absensi = Absensi.query.filter_by(
+            id_mahasiswa=mahasiswa_id,
+            tanggal=today
+        ).first()
+        
+        if existing_absensi:
+            CHECKIN_OUTCOMES.inc(endpoint=endpoint, outcome='duplicate')
+            return {
+                'success': False,
+                'message': 'Anda sudah melakukan absensi hari ini'
+            }, 400
+        
+        # Create absensi record
+        now = datetime.now()
+        new_absensi = Absensi(
+            id_mahasiswa=mahasiswa_id,
+            tanggal=today,
+            jam=now.time(),
+            status='hadir'
+        )
+        
+        db.session.add(new_absensi)
+        db.session.commit()
+    
+    CHECKIN_OUTCOMES.inc(endpoint=endpoint, outcome='success')
+    return {
+        'success': True,
+        'message': 'Absensi berhasil',
+        'data': {
+            'nama': nama,
+            'tanggal': today.strftime('%Y-%m-%d'),
+            'jam': now.strftime('%H:%M:%S'),
+            'confidence': confidence
+        }
+    }, 201
+
+def check_in_job(current_user, image_data, roster):
+    """check_in yang dijalankan worker antrian async"""
+    try:
+        return check_in(current_user, image_data, endpoint='absensi_async', roster=roster)
+    except RecognitionBusy:
+        CHECKIN_OUTCOMES.inc(endpoint='absensi_async', outcome='busy')
+        return {
+            'success': False,
+            'message': 'Server sedang sibuk memproses absensi, coba lagi sebentar'
+        }, 503
+    except Exception as e:
+        db.session.rollback()
+        CHECKIN_OUTCOMES.inc(endpoint='absensi_async', outcome='error')
+        return {
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }, 500
+
+def wants_async():
+    """Client minta mode async lewat ?async=1 atau header Prefer: respond-async"""
+    if request.args.get('async') in ('1', 'true'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
 @absensi_bp.route('/absensi', methods=['POST'])
 @jwt_required()
 def submit_absensi():
-    """Submit absensi dengan foto wajah"""
+    """Submit absensi dengan foto wajah (sinkron, atau async kalau diminta)"""
     try:
         current_user = get_jwt_identity()
-        data = request.get_json()
         
-        # Get image data (base64)
-        image_data = data.get('image')
+        too_large = payload_too_large()
+        if too_large:
+            return too_large
+        
+        # Get image data (JPEG mentah, multipart, atau base64)
+        image_data = get_request_image()
         if not image_data:
             return jsonify({
                 'success': False,
                 'message': 'Foto wajah diperlukan'
             }), 400
         
-        # Recognize face
-        recognition_result, error = face_model.recognize_face(image_data)
+        # Batasi recognition ke roster kelas/jurusan bila diminta
+        roster, roster_error = get_request_roster(current_user)
+        if roster_error:
+            return jsonify({
+                'success': False,
+                'message': roster_error
+            }), 400
+        
+        if wants_async() and recognition_jobs.enabled:
+            # Masukkan ke antrian, worker WSGI langsung bebas lagi
+            job = recognition_jobs.submit(current_user, check_in_job, current_user, image_data, roster)
+            if job is None:
+                response = jsonify({
+                    'success': False,
+                    'message': 'Antrian absensi penuh, coba lagi sebentar'
+                })
+                response.headers['Retry-After'] = '1'
+                return response, 503
+            
+            response = jsonify({
+                'success': True,
+                'message': 'Absensi sedang diproses',
+                'data': dict(job.to_dict(), queue_depth=recognition_jobs.stats()['queue_depth'])
+            })
+            response.headers['Location'] = f'/api/absensi/jobs/{job.id}'
+            return response, 202
+        
+        body, status_code = check_in(current_user, image_data, roster=roster)
+        return jsonify(body), status_code
+        
+    except RecognitionBusy:
+        CHECKIN_OUTCOMES.inc(endpoint='absensi', outcome='busy')
+        return recognition_busy()
+    except Exception as e:
+        db.session.rollback()
+        CHECKIN_OUTCOMES.inc(endpoint='absensi', outcome='error')
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+def get_recognition_job(job_id):
+    """Job milik user yang login, atau response error"""
+    job = recognition_jobs.get(job_id)
+    if job is None:
+        return None, (jsonify({
+            'success': False,
+            'message': 'Job tidak ditemukan atau sudah kedaluwarsa'
+        }), 404)
+    if job.owner != get_jwt_identity():
+        return None, (jsonify({
+            'success': False,
+            'message': 'Job bukan milik akun ini'
+        }), 403)
+    return job, None
+
+@absensi_bp.route('/absensi/jobs', methods=['GET'])
+@jwt_required()
+def get_recognition_queue():
+    """Statistik antrian async (kedalaman antrian, job berjalan, ditolak)"""
+    return jsonify({
+        'success': True,
+        'data': recognition_jobs.stats()
+    }), 200
+
+@absensi_bp.route('/absensi/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_recognition_job_status(job_id):
+    """Polling status dan hasil job absensi async"""
+    job, error_response = get_recognition_job(job_id)
+    if error_response:
+        return error_response
+    
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    }), 200
+
+@absensi_bp.route('/absensi/jobs/<job_id>/events', methods=['GET'])
+@jwt_required()
+def stream_recognition_job(job_id):
+    """Server-sent events: kirim setiap perubahan status sampai job selesai"""
+    job, error_response = get_recognition_job(job_id)
+    if error_response:
+        return error_response
+    
+    try:
+        timeout = float(request.args.get('timeout', 30))
+    except ValueError:
+        timeout = None
+    if timeout is None or not timeout > 0:
+        return jsonify({
+            'success': False,
+            'message': 'Timeout harus berupa angka detik lebih dari 0'
+        }), 400
+    timeout = min(timeout, MAX_EVENTS_TIMEOUT)
+    
+    def events():
+        deadline = time_module.monotonic() + timeout
+        while True:
+            yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+            if job.done:
+                return
+            remaining = deadline - time_module.monotonic()
+            if remaining <= 0:
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            recognition_jobs.wait(job, min(remaining, 15))
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@absensi_bp.route('/absensi/batch', methods=['POST'])
+@jwt_required()
+def submit_absensi_batch():
+    """Submit absensi untuk banyak foto sekaligus dalam satu request"""
+    try:
+        current_user = get_jwt_identity()
+        
+        too_large = payload_too_large()
+        if too_large:
+            return too_large
         
-        if error:
+        images = get_request_images()
+        if not images or not isinstance(images, list):
             return jsonify({
                 'success': False,
-                'message': error
+                'message': 'Daftar foto wajah diperlukan'
             }), 400
         
-        if not recognition_result:
+        if len(images) > MAX_BATCH_IMAGES:
             return jsonify({
                 'success': False,
-                'message': 'Wajah tidak dikenali'
+                'message': f'Maksimal {MAX_BATCH_IMAGES} foto per batch'
             }), 400
         
-        mahasiswa_id = recognition_result['mahasiswa_id']
-        nama = recognition_result['nama']
-        confidence = recognition_result['confidence']
+        if not all(images):
+            return jsonify({
+                'success': False,
+                'message': 'Foto wajah diperlukan'
+            }), 400
         
-        # Check if user is mahasiswa and matches the recognized face
-        if current_user.get('type') == 'mahasiswa' and current_user.get('id') != mahasiswa_id:
+        roster, roster_error = get_request_roster(current_user)
+        if roster_error:
             return jsonify({
                 'success': False,
-                'message': 'Wajah tidak sesuai dengan akun yang login'
-            }), 403
+                'message': roster_error
+            }), 400
+        
+        # Recognize semua frame dalam satu pass (tersebar ke worker bila aktif)
+        analyses = recognition_executor.analyze_many(images, roster=roster)
+        
+        results = []
+        recognized = {}
+        for index, analysis in enumerate(analyses):
+            recognition_result = analysis['recognition']
+            error = analysis['error']
+            
+            if error or not recognition_result:
+                CHECKIN_OUTCOMES.inc(endpoint='batch', outcome=analysis_outcome(analysis))
+                result = {
+                    'index': index,
+                    'success': False,
+                    'message': error or 'Wajah tidak dikenali'
+                }
+                quality = analysis.get('quality')
+                if quality and not quality['ok']:
+                    result['reason'] = quality['reason']
+                results.append(result)
+                continue
+            
+            mahasiswa_id = recognition_result['mahasiswa_id']
+            if current_user.get('type') == 'mahasiswa' and current_user.get('id') != mahasiswa_id:
+                CHECKIN_OUTCOMES.inc(endpoint='batch', outcome='mismatch')
+                results.append({
+                    'index': index,
+                    'success': False,
+                    'message': 'Wajah tidak sesuai dengan akun yang login'
+                })
+                continue
+            
+            results.append({
+                'index': index,
+                'success': True,
+                'recognition': recognition_result
+            })
+            # Simpan frame dengan confidence tertinggi per mahasiswa
+            best = recognized.get(mahasiswa_id)
+            if best is None or recognition_result['confidence'] > best['confidence']:
+                recognized[mahasiswa_id] = recognition_result
         
-        # Check if already absen today
         today = date.today()
-        existing_absensi = Absensi.query.filter_by(
-            id_mahasiswa=mahasiswa_id,
-            tanggal=today
-        ).first()
+        now = datetime.now()
+        new_ids, already_absen = insert_absensi(list(recognized), today, now)
+        
+        # Susun hasil per frame
+        recorded = set()
+        for result in results:
+            recognition_result = result.pop('recognition', None)
+            if not recognition_result:
+                continue
+            
+            mahasiswa_id = recognition_result['mahasiswa_id']
+            result['data'] = {
+                'mahasiswa_id': mahasiswa_id,
+                'nama': recognition_result['nama'],
+                'confidence': recognition_result['confidence']
+            }
+            if mahasiswa_id in already_absen or mahasiswa_id in recorded:
+                CHECKIN_OUTCOMES.inc(endpoint='batch', outcome='duplicate')
+                result['success'] = False
+                result['message'] = 'Sudah melakukan absensi hari ini'
+            else:
+                CHECKIN_OUTCOMES.inc(endpoint='batch', outcome='success')
+                recorded.add(mahasiswa_id)
+                result['message'] = 'Absensi berhasil'
+                result['data']['tanggal'] = today.strftime('%Y-%m-%d')
+                result['data']['jam'] = now.strftime('%H:%M:%S')
         
-        if existing_absensi:
+        return jsonify({
+            'success': True,
+            'message': f'{len(new_ids)} absensi berhasil dicatat',
+            'data': results,
+            'total': len(results)
+        }), 200
+        
+    except RecognitionBusy:
+        CHECKIN_OUTCOMES.inc(endpoint='batch', outcome='busy')
+        return recognition_busy()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+def get_stream_session(session_id):
+    """Sesi stream milik user yang login, atau response error"""
+    session = stream_sessions.get(session_id)
+    if session is None:
+        return None, (jsonify({
+            'success': False,
+            'message': 'Sesi stream tidak ditemukan atau sudah berakhir'
+        }), 404)
+    if session.owner != get_jwt_identity():
+        return None, (jsonify({
+            'success': False,
+            'message': 'Sesi stream bukan milik akun ini'
+        }), 403)
+    return session, None
+
+@absensi_bp.route('/absensi/stream', methods=['POST'])
+@jwt_required()
+def start_stream():
+    """Mulai sesi streaming untuk kiosk (kirim frame ke /absensi/stream/<id>/frame)"""
+    try:
+        current_user = get_jwt_identity()
+        
+        # Roster kelas/jurusan berlaku untuk semua frame di sesi ini
+        roster, roster_error = get_request_roster(current_user)
+        if roster_error:
             return jsonify({
                 'success': False,
-                'message': 'Anda sudah melakukan absensi hari ini'
+                'message': roster_error
             }), 400
         
-        # Create absensi record
-        now = datetime.now()
-        new_absensi = Absensi(
-            id_mahasiswa=mahasiswa_id,
-            tanggal=today,
-            jam=now.time(),
-            status='hadir'
-        )
-        
-        db.session.add(new_absensi)
-        db.session.commit()
+        session = stream_sessions.create(current_user)
+        if session is None:
+            return jsonify({
+                'success': False,
+                'message': 'Terlalu banyak sesi stream aktif'
+            }), 503
+        session.roster = face_model.roster_key(roster)
         
         return jsonify({
             'success': True,
-            'message': 'Absensi berhasil',
-            'data': {
-                'nama': nama,
-                'tanggal': today.strftime('%Y-%m-%d'),
-                'jam': now.strftime('%H:%M:%S'),
-                'confidence': confidence
-            }
+            'data': session.to_dict()
         }), 201
         
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+@absensi_bp.route('/absensi/stream/<session_id>/frame', methods=['POST'])
+@jwt_required()
+def submit_stream_frame(session_id):
+    """Proses satu frame stream.
+    
+    Wajah diikuti antar frame; recognition hanya untuk wajah baru atau yang
+    belum pasti, dan setiap mahasiswa menghasilkan satu event absensi per sesi.
+    """
+    try:
+        current_user = get_jwt_identity()
+        session, error_response = get_stream_session(session_id)
+        if error_response:
+            return error_response
+        
+        too_large = payload_too_large()
+        if too_large:
+            return too_large
+        
+        image_data = get_request_image()
+        if not image_data:
+            return jsonify({
+                'success': False,
+                'message': 'Frame diperlukan'
+            }), 400
+        
+        # Frame satu sesi diproses berurutan, tracking butuh urutan frame
+        with session.lock:
+            session.stats['frames'] += 1
+            analysis = face_model.analyze(image_data)
+            if analysis.gray is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid image data'
+                }), 400
+            
+            if face_model.quality_gate:
+                quality = analysis.quality()
+                if not quality['ok']:
+                    # Frame jelek dilewati, track tetap hidup sampai timeout
+                    observe_stages(analysis.timings)
+                    return jsonify({
+                        'success': True,
+                        'data': {
+                            'frame': session.stats['frames'],
+                            'skipped': quality['reason'],
+                            'tracks': [t.to_dict() for t in session.tracker.tracks.values()],
+                            'events': []
+                        }
+                    }), 200
+            
+            face_model.ensure_model()
+            # Deteksi dulu, supaya durasi 'track' hanya asosiasi + recognition
+            analysis.faces
+            start = time_module.perf_counter()
+            tracks, confirmed, recognitions = session.tracker.process(
+                analysis, lambda face_roi: face_model.recognize_roi(face_roi, session.roster)
+            )
+            analysis.add_timing('track', time_module.perf_counter() - start)
+            observe_stages(analysis.timings)
+            session.stats['recognitions'] += recognitions
+            
+            # Satu event per mahasiswa per sesi
+            event_tracks = {}
+            for track in confirmed:
+                mahasiswa_id = track.mahasiswa_id
+                if mahasiswa_id in session.emitted or mahasiswa_id in event_tracks:
+                    continue
+                if current_user.get('type') == 'mahasiswa' and current_user.get('id') != mahasiswa_id:
+                    continue
+                event_tracks[mahasiswa_id] = track
+            session.emitted.update(event_tracks)
+            
+            events = []
+            if event_tracks:
+                today = date.today()
+                now = datetime.now()
+                new_ids, _ = insert_absensi(list(event_tracks), today, now)
+                for mahasiswa_id, track in event_tracks.items():
+                    recorded = mahasiswa_id in new_ids
+                    CHECKIN_OUTCOMES.inc(endpoint='stream', outcome='success' if recorded else 'duplicate')
+                    events.append({
+                        'track_id': track.id,
+                        'mahasiswa_id': mahasiswa_id,
+                        'nama': track.nama,
+                        'confidence': track.confidence,
+                        'recorded': recorded,
+                        'message': 'Absensi berhasil' if recorded else 'Sudah melakukan absensi hari ini',
+                        'tanggal': today.strftime('%Y-%m-%d'),
+                        'jam': now.strftime('%H:%M:%S')
+                    })
+                session.stats['events'] += len(events)
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'frame': session.stats['frames'],
+                    'recognitions': recognitions,
+                    'tracks': [t.to_dict() for t in tracks],
+                    'events': events
+                }
+            }), 200
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -93,6 +676,28 @@ def submit_absensi():
             'message': f'Error: {str(e)}'
         }), 500
 
+@absensi_bp.route('/absensi/stream/<session_id>', methods=['DELETE'])
+@jwt_required()
+def stop_stream(session_id):
+    """Akhiri sesi streaming"""
+    try:
+        session, error_response = get_stream_session(session_id)
+        if error_response:
+            return error_response
+        
+        stream_sessions.close(session_id)
+        return jsonify({
+            'success': True,
+            'message': 'Sesi stream diakhiri',
+            'data': session.to_dict()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
 @absensi_bp.route('/absensi', methods=['GET'])
 @jwt_required()
 def get_absensi():
@@ -342,8 +947,11 @@ def get_absensi_statistics():
 def verify_face():
     """Verify apakah ada wajah dalam foto (untuk testing)"""
     try:
-        data = request.get_json()
-        image_data = data.get('image')
+        too_large = payload_too_large()
+        if too_large:
+            return too_large
+        
+        image_data = get_request_image()
         
         if not image_data:
             return jsonify({
@@ -351,18 +959,25 @@ def verify_face():
                 'message': 'Foto wajah diperlukan'
             }), 400
         
-        # Check if face is detected
-        face_detected = face_model.detect_face(image_data)
-        face_count = face_model.get_face_count(image_data)
+        # Check if face is detected (satu kali decode untuk deteksi dan hitung)
+        analysis = recognition_executor.analyze_image(image_data, recognize=False)
+        
+        quality = analysis.get('quality')
+        data = {
+            'face_detected': analysis['face_detected'],
+            'face_count': analysis['face_count']
+        }
+        if quality and not quality['ok']:
+            data['quality_reason'] = quality['reason']
+            data['message'] = analysis['error']
         
         return jsonify({
             'success': True,
-            'data': {
-                'face_detected': face_detected,
-                'face_count': face_count
-            }
+            'data': data
         }), 200
         
+    except RecognitionBusy:
+        return recognition_busy()
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1,11 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from database import db, Mahasiswa
-from model.face_recognition_model import face_model
-import os
-import uuid
+from model.lazy_model import face_model
+from model.enrollment import (
+    EnrollmentPhoto, remove_enrollment_photo, face_crop_path, thumbnail_path, ensure_thumbnails
+)
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import csv
+import io
+import os
+import posixpath
+import zipfile
 
 mahasiswa_bp = Blueprint('mahasiswa', __name__)
 
@@ -13,10 +21,52 @@ mahasiswa_bp = Blueprint('mahasiswa', __name__)
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Cache browser untuk foto mahasiswa (detik); revalidasi lewat ETag
+PHOTO_MAX_AGE = 7 * 24 * 3600
+PHOTO_VARIANTS = ('thumb', 'face', 'original')
+
+# Batas ukuran satu foto di dalam arsip bulk enrollment
+BULK_MAX_PHOTO_SIZE = 10 * 1024 * 1024
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def read_bulk_csv(archive):
+    """Baca baris CSV nim,nama,jurusan[,foto] dari field 'csv' atau file .csv di dalam ZIP"""
+    csv_file = request.files.get('csv')
+    if csv_file:
+        content = csv_file.read()
+    else:
+        names = [name for name in archive.namelist() if name.lower().endswith('.csv')]
+        if not names:
+            return None
+        content = archive.read(names[0])
+    reader = csv.DictReader(io.StringIO(content.decode('utf-8-sig')))
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    return list(reader)
+
+def existing_nims(nims, chunk_size=500):
+    """NIM yang sudah ada di database, dicek per chunk"""
+    nims = list(nims)
+    found = set()
+    for i in range(0, len(nims), chunk_size):
+        rows = Mahasiswa.query.with_entities(Mahasiswa.nim).filter(Mahasiswa.nim.in_(nims[i:i + chunk_size])).all()
+        found.update(row.nim for row in rows)
+    return found
+
+def enroll_archive_photo(archive, member):
+    """Dijalankan di thread pool: decode + deteksi sekali, simpan foto dan crop kalau valid"""
+    try:
+        if archive.getinfo(member).file_size > BULK_MAX_PHOTO_SIZE:
+            return None, 'photo_too_large', 'Ukuran foto terlalu besar'
+        photo = EnrollmentPhoto(face_model, archive.read(member), secure_filename(posixpath.basename(member)))
+        if not photo.ok:
+            return None, photo.reason, photo.error
+        return (photo.save(UPLOAD_FOLDER), photo.face_roi), None, None
+    except Exception as e:
+        return None, 'error', f'Error: {str(e)}'
+
 @mahasiswa_bp.route('/mahasiswa', methods=['GET'])
 @jwt_required()
 def get_mahasiswa():
@@ -78,6 +128,74 @@ def get_mahasiswa_by_id(mahasiswa_id):
             'message': f'Error: {str(e)}'
         }), 500
 
+@mahasiswa_bp.route('/mahasiswa/<int:mahasiswa_id>/foto', methods=['GET'])
+@jwt_required()
+def get_foto_mahasiswa(mahasiswa_id):
+    """Foto mahasiswa: variant thumb (default, WebP/JPEG 160px), face (crop 100x100) atau original.
+    
+    Response mendukung ETag/If-None-Match (304) dan Range (206), jadi
+    dashboard cukup memakai thumbnail dan cache browser.
+    """
+    try:
+        current_user = get_jwt_identity()
+        
+        # Check if user is admin or the mahasiswa itself
+        if current_user.get('type') == 'mahasiswa' and current_user.get('id') != mahasiswa_id:
+            return jsonify({
+                'success': False,
+                'message': 'Akses ditolak'
+            }), 403
+        
+        variant = request.args.get('variant', 'thumb')
+        if variant not in PHOTO_VARIANTS:
+            return jsonify({
+                'success': False,
+                'message': f"Variant harus salah satu dari: {', '.join(PHOTO_VARIANTS)}"
+            }), 400
+        
+        mahasiswa = Mahasiswa.query.get(mahasiswa_id)
+        if not mahasiswa or not mahasiswa.foto_wajah or not os.path.exists(mahasiswa.foto_wajah):
+            return jsonify({
+                'success': False,
+                'message': 'Foto tidak ditemukan'
+            }), 404
+        
+        negotiated = False
+        if variant == 'original':
+            path = mahasiswa.foto_wajah
+        elif variant == 'face':
+            path = face_crop_path(mahasiswa.foto_wajah)
+        else:
+            image_format = request.args.get('format')
+            if image_format not in ('webp', 'jpg'):
+                # WebP untuk browser yang menyatakan dukungan di header Accept
+                negotiated = True
+                image_format = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpg'
+            path = thumbnail_path(mahasiswa.foto_wajah, image_format)
+            if not os.path.exists(path):
+                # Foto yang didaftarkan sebelum ada thumbnail
+                ensure_thumbnails(mahasiswa.foto_wajah)
+        
+        if not os.path.exists(path):
+            return jsonify({
+                'success': False,
+                'message': 'Foto tidak ditemukan'
+            }), 404
+        
+        # File foto tidak pernah ditimpa (nama unik per upload), aman di-cache lama
+        response = send_file(os.path.abspath(path), conditional=True, etag=True)
+        response.headers['Cache-Control'] = f'private, max-age={PHOTO_MAX_AGE}'
+        response.headers['Accept-Ranges'] = 'bytes'
+        if negotiated:
+            response.vary.add('Accept')
+        return response
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
 @mahasiswa_bp.route('/mahasiswa', methods=['POST'])
 @jwt_required()
 def create_mahasiswa():
@@ -116,35 +234,16 @@ def create_mahasiswa():
         foto_path = ''
         
         if foto_wajah and allowed_file(foto_wajah.filename):
-            # Generate unique filename
-            filename = secure_filename(foto_wajah.filename)
-            unique_filename = f"{uuid.uuid4()}_{filename}"
-            foto_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-            
-            # Ensure upload directory exists
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-            
-            # Save file
-            foto_wajah.save(foto_path)
-            
-            # Verify face detection
-            if not face_model.detect_face(foto_path):
-                # Delete file if no face detected
-                os.remove(foto_path)
+            # Decode dan deteksi sekali di memory, file baru ditulis kalau valid
+            photo = EnrollmentPhoto(face_model, foto_wajah.read(), secure_filename(foto_wajah.filename))
+            if not photo.ok:
                 return jsonify({
                     'success': False,
-                    'message': 'Tidak ada wajah terdeteksi dalam foto'
+                    'message': photo.error
                 }), 400
             
-            # Check face count
-            face_count = face_model.get_face_count(foto_path)
-            if face_count > 1:
-                # Delete file if multiple faces
-                os.remove(foto_path)
-                return jsonify({
-                    'success': False,
-                    'message': 'Hanya satu wajah yang diperbolehkan dalam foto'
-                }), 400
+            # Simpan foto asli dan crop wajah ternormalisasi
+            foto_path = photo.save(UPLOAD_FOLDER)
         
         else:
             return jsonify({
@@ -163,8 +262,8 @@ def create_mahasiswa():
         db.session.add(new_mahasiswa)
         db.session.commit()
         
-        # Add face to recognition model
-        face_model.add_face(foto_path, new_mahasiswa.id, nama)
+        # Add face to recognition model (ROI dari deteksi di atas)
+        face_model.add_face_roi(photo.face_roi, new_mahasiswa.id, nama)
         
         return jsonify({
             'success': True,
@@ -175,8 +274,160 @@ def create_mahasiswa():
     except Exception as e:
         db.session.rollback()
         # Clean up file if error occurs
-        if 'foto_path' in locals() and foto_path and os.path.exists(foto_path):
-            os.remove(foto_path)
+        if 'foto_path' in locals() and foto_path:
+            remove_enrollment_photo(foto_path)
+        
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+@mahasiswa_bp.route('/mahasiswa/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_mahasiswa():
+    """Tambah banyak mahasiswa dari ZIP foto + CSV nim,nama,jurusan.
+    
+    Foto dicocokkan lewat kolom 'foto' (path di dalam ZIP) atau nama file
+    <nim>.jpg/.png. Wajah diekstrak paralel, semua baris mahasiswa disimpan
+    dalam satu commit dan model di-update dalam satu training pass di
+    background; check-in tetap jalan dengan model lama sampai selesai.
+    """
+    saved_paths = []
+    try:
+        current_user = get_jwt_identity()
+        
+        # Check if user is admin
+        if current_user.get('type') != 'admin':
+            return jsonify({
+                'success': False,
+                'message': 'Akses ditolak'
+            }), 403
+        
+        # Arsip ZIP punya batas ukuran sendiri, bukan MAX_CONTENT_LENGTH check-in
+        max_size = current_app.config['BULK_MAX_UPLOAD_SIZE']
+        request.max_content_length = max_size
+        try:
+            archive_file = request.files.get('archive')
+        except RequestEntityTooLarge:
+            return jsonify({
+                'success': False,
+                'message': f'Ukuran arsip maksimal {max_size // (1024 * 1024)} MB'
+            }), 413
+        if not archive_file:
+            return jsonify({
+                'success': False,
+                'message': 'File ZIP foto (field archive) diperlukan'
+            }), 400
+        
+        try:
+            archive = zipfile.ZipFile(archive_file.stream)
+        except zipfile.BadZipFile:
+            return jsonify({
+                'success': False,
+                'message': 'File archive bukan ZIP yang valid'
+            }), 400
+        
+        rows = read_bulk_csv(archive)
+        if rows is None:
+            return jsonify({
+                'success': False,
+                'message': 'CSV nim,nama,jurusan diperlukan (field csv atau file .csv di dalam ZIP)'
+            }), 400
+        
+        # Foto di ZIP berdasarkan nama file tanpa ekstensi (= NIM)
+        members = set(archive.namelist())
+        photos = {}
+        for name in archive.namelist():
+            basename = posixpath.basename(name)
+            if allowed_file(basename):
+                photos.setdefault(basename.rsplit('.', 1)[0], name)
+        
+        rejected = []
+        
+        def reject(row_number, nim, reason, message):
+            rejected.append({'row': row_number, 'nim': nim, 'reason': reason, 'message': message})
+        
+        # Validasi CSV dulu supaya foto baris yang pasti ditolak tidak diproses
+        candidates = []
+        seen = set()
+        for row_number, row in enumerate(rows, start=2):
+            nim = (row.get('nim') or '').strip()
+            nama = (row.get('nama') or '').strip()
+            jurusan = (row.get('jurusan') or '').strip()
+            if not nim or not nama or not jurusan:
+                reject(row_number, nim, 'missing_field', 'NIM, nama, dan jurusan diperlukan')
+                continue
+            if nim in seen:
+                reject(row_number, nim, 'duplicate_nim', 'NIM duplikat di CSV')
+                continue
+            seen.add(nim)
+            member = (row.get('foto') or '').strip() or photos.get(nim)
+            if not member or member not in members:
+                reject(row_number, nim, 'missing_photo', 'Foto tidak ditemukan di ZIP')
+                continue
+            candidates.append((row_number, nim, nama, jurusan, member))
+        
+        registered = existing_nims(nim for _, nim, _, _, _ in candidates)
+        for row_number, nim, _, _, _ in candidates:
+            if nim in registered:
+                reject(row_number, nim, 'duplicate_nim', 'NIM sudah terdaftar')
+        candidates = [candidate for candidate in candidates if candidate[1] not in registered]
+        
+        # Ekstraksi wajah paralel (decode dan deteksi OpenCV melepas GIL)
+        with ThreadPoolExecutor(max_workers=max(1, face_model.rebuild_workers)) as executor:
+            results = list(executor.map(
+                lambda candidate: enroll_archive_photo(archive, candidate[4]), candidates
+            ))
+        
+        new_mahasiswa = []
+        face_rois = []
+        for (row_number, nim, nama, jurusan, _), (saved, reason, message) in zip(candidates, results):
+            if saved is None:
+                reject(row_number, nim, reason, message)
+                continue
+            foto_path, face_roi = saved
+            saved_paths.append(foto_path)
+            new_mahasiswa.append(Mahasiswa(nim=nim, nama=nama, jurusan=jurusan, foto_wajah=foto_path))
+            face_rois.append(face_roi)
+        
+        # Semua baris disimpan dalam satu commit. Id dan data response diambil
+        # setelah flush, sebelum commit meng-expire objek (satu SELECT per baris)
+        created = []
+        if new_mahasiswa:
+            db.session.add_all(new_mahasiswa)
+            db.session.flush()
+            ids = [mahasiswa.id for mahasiswa in new_mahasiswa]
+            names = [mahasiswa.nama for mahasiswa in new_mahasiswa]
+            created = [mahasiswa.to_dict() for mahasiswa in new_mahasiswa]
+            db.session.commit()
+            saved_paths = []
+            
+            # Satu training pass untuk semua wajah baru, di thread trainer
+            app = current_app._get_current_object()
+            
+            def train():
+                with app.app_context():
+                    face_model.add_faces(face_rois, ids, names)
+            
+            face_model.train_in_background(train)
+        
+        rejected.sort(key=lambda item: item['row'])
+        return jsonify({
+            'success': True,
+            'message': f'{len(created)} mahasiswa berhasil ditambahkan, {len(rejected)} ditolak',
+            'data': {
+                'created': len(created),
+                'rejected': rejected,
+                'training': 'background' if created else None,
+                'mahasiswa': created
+            }
+        }), 201 if created else 200
+        
+    except Exception as e:
+        db.session.rollback()
+        # Hapus foto yang sudah ditulis kalau insert gagal
+        for foto_path in saved_paths:
+            remove_enrollment_photo(foto_path)
         
         return jsonify({
             'success': False,
@@ -251,8 +502,8 @@ def delete_mahasiswa(mahasiswa_id):
             }), 404
         
         # Delete photo file if exists
-        if mahasiswa.foto_wajah and os.path.exists(mahasiswa.foto_wajah):
-            os.remove(mahasiswa.foto_wajah)
+        if mahasiswa.foto_wajah:
+            remove_enrollment_photo(mahasiswa.foto_wajah)
         
         db.session.delete(mahasiswa)
         db.session.commit()
@@ -1,4 +1,4 @@
-from app import create_app
+from app import create_app, start_face_warmup
 import logging
 
 # Set up logging
@@ -8,6 +8,7 @@ logger = logging.getLogger(__name__)
 def run_server():
     try:
         app = create_app()
+        start_face_warmup(app)
         print("🚀 Starting Flask server...")
         print("📍 Server will run on: http://127.0.0.1:8000")
         print("🔧 Debug mode: ON")
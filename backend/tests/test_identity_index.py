@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from model.identity_index import IdentityIndex, chi_square, lbp_histograms
+from model.model_snapshot import ModelSnapshot
+
+
+@pytest.fixture(scope='module')
+def histograms():
+    rng = np.random.default_rng(0)
+    return lbp_histograms(rng.integers(0, 256, (40, 100, 100), dtype=np.uint8))
+
+
+@pytest.fixture
+def mapped_index(tmp_path, histograms):
+    """Index 20 wajah dengan base memory-mapped read-only, seperti hasil read_base"""
+    path = str(tmp_path / 'index.npy')
+    np.save(path, np.sqrt(histograms[:20]))
+    return IdentityIndex.from_arrays(np.load(path, mmap_mode='r'), np.arange(20), shortlist=8)
+
+
+def test_search_matches_exact_chi_square(mapped_index, histograms):
+    index = mapped_index.extended(histograms[20:], np.arange(20, 40))
+    for i in (3, 27):
+        expected = np.argsort(chi_square(histograms, histograms[i]), kind='stable')[:3]
+        assert [mahasiswa_id for mahasiswa_id, _ in index.search(histograms[i], k=3)] == list(expected)
+
+
+def test_extended_never_copies_or_writes_base(mapped_index, histograms):
+    index = mapped_index
+    for i in range(20, 40):
+        index = index.extended(histograms[i], [i])
+
+    assert index._base is mapped_index._base
+    assert isinstance(index._base, np.memmap)
+    assert len(index) == 40 and index.base_size == 20
+    assert index.search(histograms[35])[0][0] == 35
+
+
+def test_extending_same_index_twice_allocates_new_buffer(histograms):
+    parent = IdentityIndex(shortlist=8)
+    parent.add(histograms[:5], np.arange(5))
+
+    first = parent.extended(histograms[5], [5])
+    second = parent.extended(histograms[6], [6])
+
+    # first sudah memakai baris setelah parent, second tidak boleh menimpanya
+    assert first._data is parent._data
+    assert second._data is not parent._data
+    assert 5 in first and 6 not in first
+    assert 6 in second and 5 not in second
+    assert first.search(histograms[5])[0] == (5, pytest.approx(0, abs=1e-6))
+    assert second.search(histograms[6])[0] == (6, pytest.approx(0, abs=1e-6))
+    np.testing.assert_array_equal(first.ids, [0, 1, 2, 3, 4, 5])
+    np.testing.assert_array_equal(second.ids, [0, 1, 2, 3, 4, 6])
+
+
+def test_older_snapshots_never_see_newer_rows(mapped_index, histograms):
+    snapshots = [ModelSnapshot(mapped_index, range(20), [f'M{i}' for i in range(20)])]
+    for i in range(20, 40):
+        snapshots.append(snapshots[-1].with_faces(histograms[i], [i], [f'M{i}']))
+
+    for count, snapshot in enumerate(snapshots):
+        size = 20 + count
+        assert len(snapshot.index) == size
+        assert snapshot.known_face_ids == list(range(size))
+        if size < 40:
+            assert size not in snapshot.index and size not in snapshot
+            # Wajah yang ditambahkan belakangan tidak pernah jadi hasil search
+            assert snapshot.index.search(histograms[size])[0][0] < size
+        rows = snapshot.index.rows_for(range(40))
+        assert len(rows) == size
+
+
+def test_roster_rows_are_global_across_base_and_delta(mapped_index, histograms):
+    index = mapped_index.extended(histograms[20:], np.arange(20, 40))
+    rows = index.rows_for([2, 25, 39])
+    np.testing.assert_array_equal(rows, [2, 25, 39])
+
+    results = index.search_many(histograms[[2, 25, 39]], k=1, rows=rows)
+    assert [matches[0][0] for matches in results] == [2, 25, 39]
+    # Roster lebih besar dari shortlist: baris di luar roster disaring dari prefilter
+    large = index.rows_for(range(10, 30))
+    results = index.search_many(histograms[[5, 12, 28]], k=1, rows=large)
+    assert results[0][0][0] in range(10, 30)
+    assert [matches[0][0] for matches in results[1:]] == [12, 28]
+
+    # Subset untuk cache roster berisi baris yang sama
+    subset = index.subset(rows)
+    assert len(subset) == 3 and subset.search(histograms[25])[0][0] == 25
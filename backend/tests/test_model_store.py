@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from model.model_store import ModelStore
+
+
+def random_face(rng):
+    return rng.integers(0, 256, (100, 100), dtype=np.uint8)
+
+
+@pytest.fixture
+def make_model(tmp_path, monkeypatch):
+    """FaceRecognitionModel baru yang berbagi folder artefak tmp_path (= proses lain)"""
+    monkeypatch.setenv('FACE_MODEL_DIR', str(tmp_path))
+    monkeypatch.setenv('FACE_MODEL_RELOAD_INTERVAL', '0')
+    from model.face_recognition_model import FaceRecognitionModel
+
+    def make():
+        model = FaceRecognitionModel()
+        model.batcher = None
+        return model
+    return make
+
+
+def test_read_delta_from_offset_matches_full_read(tmp_path):
+    store = ModelStore(str(tmp_path))
+    with store.lock():
+        store.write_manifest({'generation': 1, 'base_generation': 1, 'format': 'npy', 'delta_count': 0})
+        manifests = [store.read_manifest()]
+        for i in range(12):
+            manifests.append(store.append_delta({'id': i, 'name': f'M{i}', 'face': np.full(10, i)}))
+
+    latest = manifests[-1]
+    everything = store.read_delta(latest)
+    assert [r['id'] for r in everything] == list(range(12))
+    for start, applied in enumerate(manifests):
+        records = store.read_delta(latest, start=start, offset=store.delta_size(applied))
+        assert [r['id'] for r in records] == list(range(start, 12))
+
+
+def test_append_delta_drops_unrecorded_tail(tmp_path):
+    store = ModelStore(str(tmp_path))
+    with store.lock():
+        store.write_manifest({'generation': 1, 'base_generation': 1, 'format': 'npy', 'delta_count': 0})
+        first = store.append_delta({'id': 1})
+        # Sisa tulisan yang tidak pernah tercatat di manifest (misal proses crash)
+        with open(store.delta_path(1), 'ab') as f:
+            f.write(b'garbage')
+        store.append_delta({'id': 2})
+
+    latest = store.read_manifest()
+    assert [r['id'] for r in store.read_delta(latest)] == [1, 2]
+    assert [r['id'] for r in store.read_delta(latest, 1, store.delta_size(first))] == [2]
+
+
+def test_peer_catches_up_across_compaction(make_model):
+    rng = np.random.default_rng(0)
+    faces = {i: random_face(rng) for i in range(1, 31)}
+
+    writer = make_model()
+    writer.max_delta_records = 5
+    writer.save_model(writer.train_faces([faces[1]], [1], ['M1']))
+    writer.model_loaded = True
+
+    peer = make_model()
+    assert peer.load_model()
+    peer.model_loaded = True
+
+    for i in range(2, 31):
+        assert writer.add_face_roi(faces[i], i, f'M{i}')
+        if i % 3 == 0:
+            # Peer kadang tertinggal beberapa delta, kadang melewati compaction
+            peer.refresh()
+            assert peer.known_face_ids == list(range(1, i + 1))
+            assert peer.applied_delta == writer.applied_delta
+            assert peer.applied_delta_size == writer.applied_delta_size
+
+    manifest = writer.store.read_manifest()
+    assert manifest['base_generation'] > 1 and manifest['delta_count'] <= writer.max_delta_records
+    peer.refresh()
+    assert peer.generation == writer.generation == manifest['generation']
+
+    fresh = make_model()
+    assert fresh.load_model()
+    for model in (peer, fresh):
+        assert model.known_face_ids == list(range(1, 31))
+        assert model.search_face(faces[17])[0]['mahasiswa_id'] == 17
+        assert model.search_face(faces[30])[0]['mahasiswa_id'] == 30